@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+
+from PySide6.QtCore import QElapsedTimer, QObject, QTimer, Qt, Signal
+
+
+# playback state of one animated tile
+# the frames of the first loop are kept when the clock grants the memory,
+# later loops replay them without decoding
+class AnimationTrack:
+    def __init__(self, movie, due, cache_size):
+        self.movie = movie
+        self.due = due
+        # bytes needed to keep every frame, 0 when the loop is not cached
+        self.cache_size = cache_size
+        self.frames = []
+        self.cached = False
+        self.position = 0
+
+        if cache_size > 0 and movie.currentFrameNumber() == 0:
+            self.frames.append((movie.currentPixmap(), AnimationClock.delay_of(movie)))
+
+    # move to the next frame, returns (pixmap, delay)
+    def advance(self):
+        if self.cached:
+            self.position = (self.position + 1) % len(self.frames)
+            return self.frames[self.position]
+
+        movie = self.movie
+        frame = movie.currentFrameNumber()
+        movie.jumpToNextFrame()
+        # past the last frame, loop
+        if movie.currentFrameNumber() == frame:
+            movie.jumpToFrame(0)
+
+        pixmap = movie.currentPixmap()
+        delay = AnimationClock.delay_of(movie)
+
+        if self.cache_size > 0:
+            frame = movie.currentFrameNumber()
+            if frame == len(self.frames):
+                self.frames.append((pixmap, delay))
+            elif frame == 0 and len(self.frames) == movie.frameCount():
+                self.cached = True
+                self.position = 0
+
+        return (pixmap, delay)
+
+
+# one timer drives all animated tiles instead of a timer per QMovie
+# only the registered(visible) movies advance, the others keep their frame
+# a track that missed its frame shows the next one and is rescheduled from now,
+# frames are dropped instead of replaying the backlog when the event loop is busy
+class AnimationClock(QObject):
+    # key, QPixmap of the new frame
+    frame_changed = Signal(object, object)
+
+    # gif delays of MIN_DELAY ms or less are played at DEFAULT_DELAY, 10 fps,
+    # like the browsers do
+    MIN_DELAY = 10
+    DEFAULT_DELAY = 100
+    # frame cache of short loops, shared by all tracks
+    MAX_CACHED_FRAMES = 64
+    CACHE_BUDGET = 64 * 1024 * 1024
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.tracks = {}
+        self.paused = False
+        self.dropped = 0
+        self.cache_size = 0
+
+        self.clock = QElapsedTimer()
+        self.clock.start()
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.on_tick)
+
+    # start advancing a movie, key identifies the tile
+    def add(self, key, movie):
+        if key in self.tracks or movie.frameCount() == 1:
+            return
+
+        cache_size = self.reserve_cache(movie)
+        self.tracks[key] = AnimationTrack(
+            movie, self.clock.elapsed() + AnimationClock.delay_of(movie), cache_size
+        )
+        self.schedule()
+
+    # stop advancing a movie, it keeps its current frame
+    def remove(self, key):
+        track = self.tracks.pop(key, None)
+        if track is None:
+            return
+
+        self.cache_size -= track.cache_size
+        self.schedule()
+
+    def clear(self):
+        self.tracks = {}
+        self.cache_size = 0
+        self.timer.stop()
+
+    # bytes for the frames of a short loop, 0 if it is too long or the budget is used up
+    def reserve_cache(self, movie):
+        count = movie.frameCount()
+        if count <= 1 or count > AnimationClock.MAX_CACHED_FRAMES:
+            return 0
+
+        size = movie.currentPixmap().size()
+        cache_size = size.width() * size.height() * 4 * count
+        if self.cache_size + cache_size > AnimationClock.CACHE_BUDGET:
+            return 0
+
+        self.cache_size += cache_size
+        return cache_size
+
+    # stop all animations, e.g. while the window is minimized
+    def pause(self):
+        self.paused = True
+        self.timer.stop()
+
+    def resume(self):
+        if not self.paused:
+            return
+
+        self.paused = False
+
+        now = self.clock.elapsed()
+        for track in self.tracks.values():
+            track.due = now + AnimationClock.delay_of(track.movie)
+        self.schedule()
+
+    @staticmethod
+    def delay_of(movie):
+        delay = movie.nextFrameDelay()
+        if delay <= AnimationClock.MIN_DELAY:
+            return AnimationClock.DEFAULT_DELAY
+        return delay
+
+    # wake up for the earliest frame
+    def schedule(self):
+        if self.paused or len(self.tracks) == 0:
+            self.timer.stop()
+            return
+
+        due = min(track.due for track in self.tracks.values())
+        self.timer.start(max(0, due - self.clock.elapsed()))
+
+    def on_tick(self):
+        now = self.clock.elapsed()
+
+        for key, track in list(self.tracks.items()):
+            if track.due > now:
+                continue
+
+            pixmap, delay = track.advance()
+
+            track.due += delay
+            if track.due <= now:
+                self.dropped += 1
+                track.due = now + delay
+
+            self.frame_changed.emit(key, pixmap)
+
+        self.schedule()
@@ -45,6 +45,14 @@
         <source>menu_open_file</source>
         <translation>Open File</translation>
     </message>
+    <message>
+        <source>menu_open_folder</source>
+        <translation>Open Folder</translation>
+    </message>
+    <message>
+        <source>menu_flipbook</source>
+        <translation>Play Sequence</translation>
+    </message>
     <message>
         <source>menu_remove_file</source>
         <translation>Clear All</translation>
@@ -92,11 +100,27 @@
 	<message>
         <source>title_remove_image</source>
         <translation>Remove image</translation>
+    </message>
+    <message>
+        <source>title_select_all</source>
+        <translation>Select all</translation>
+    </message>
+    <message>
+        <source>title_remove_selected</source>
+        <translation>Remove selected</translation>
+    </message>
+    <message>
+        <source>title_export</source>
+        <translation>Export to...</translation>
     </message>
 	<message>
         <source>title_choose_image</source>
         <translation>Choose image</translation>
     </message>
+    <message>
+        <source>title_choose_folder</source>
+        <translation>Choose folder</translation>
+    </message>
 
 </context>
 <context>
@@ -160,6 +184,29 @@
         <translation>pixels</translation>
     </message>
 </context>
+<context>
+    <name>FlipbookWindow</name>
+    <message>
+        <source>title_flipbook</source>
+        <translation>Flipbook</translation>
+    </message>
+    <message>
+        <source>title_play</source>
+        <translation>Play</translation>
+    </message>
+    <message>
+        <source>title_pause</source>
+        <translation>Pause</translation>
+    </message>
+    <message>
+        <source>title_dropped</source>
+        <translation>dropped</translation>
+    </message>
+    <message>
+        <source>title_buffered</source>
+        <translation>buffered</translation>
+    </message>
+</context>
 <context>
     <name>SettingWindow</name>
 	<message>
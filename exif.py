@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import sys
+
+
+# embedded JPEG previews of photos, found by reading the headers only
+# JPEG files keep a small thumbnail in the EXIF block(IFD1),
+# TIFF based RAW files(CR2/NEF/DNG/ARW) keep one or more JPEG previews in their IFDs
+# only baseline/progressive JPEG previews are returned, Qt can not decode lossless ones
+class PreviewReader:
+    # tiff tags
+    TAG_COMPRESSION = 0x0103
+    TAG_STRIP_OFFSETS = 0x0111
+    TAG_ORIENTATION = 0x0112
+    TAG_STRIP_BYTE_COUNTS = 0x0117
+    TAG_SUB_IFDS = 0x014A
+    TAG_JPEG_OFFSET = 0x0201
+    TAG_JPEG_LENGTH = 0x0202
+    TAG_EXIF_IFD = 0x8769
+
+    # old style and new style JPEG compression
+    JPEG_COMPRESSIONS = (6, 7)
+    # SOF markers Qt decodes: baseline, extended sequential, progressive
+    JPEG_SOF = (0xC0, 0xC1, 0xC2)
+
+    # bytes per value of the tiff types
+    TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 13: 4}
+
+    # corrupt files can point the IFDs at each other
+    MAX_IFDS = 32
+
+    # smallest embedded preview, returns (jpeg bytes, exif orientation) or None
+    @staticmethod
+    def thumbnail(file_path):
+        return PreviewReader.read(file_path, largest=False)
+
+    # largest embedded preview, returns (jpeg bytes, exif orientation) or None
+    @staticmethod
+    def largest(file_path):
+        return PreviewReader.read(file_path, largest=True)
+
+    # size of the largest preview with the orientation applied, (0, 0) if there is none
+    @staticmethod
+    def size(file_path):
+        orientation, previews = PreviewReader.previews(file_path)
+        if len(previews) == 0:
+            return (0, 0)
+
+        offset, length, width, height = max(previews, key=lambda p: p[2] * p[3])
+        if orientation >= 5:
+            return (height, width)
+        return (width, height)
+
+    @staticmethod
+    def read(file_path, largest):
+        orientation, previews = PreviewReader.previews(file_path)
+        if len(previews) == 0:
+            return None
+
+        preview = (max if largest else min)(previews, key=lambda p: p[2] * p[3])
+        offset, length = preview[0], preview[1]
+
+        try:
+            with open(file_path, "rb") as f:
+                f.seek(offset)
+                data = f.read(length)
+        except OSError:
+            return None
+
+        if len(data) != length:
+            return None
+
+        return (data, orientation)
+
+    # exif orientation and the decodable previews of a file
+    # returns (orientation, [(offset, length, width, height), ...])
+    @staticmethod
+    def previews(file_path):
+        try:
+            with open(file_path, "rb") as f:
+                file_size = os.fstat(f.fileno()).st_size
+                head = f.read(4)
+
+                if head[:2] == b"\xff\xd8":
+                    base = PreviewReader.find_exif(f)
+                    if base is None:
+                        return (1, [])
+                elif head in (b"II*\x00", b"MM\x00*"):
+                    base = 0
+                else:
+                    return (1, [])
+
+                return PreviewReader.read_tiff(f, base, file_size)
+        except (OSError, struct.error, ValueError):
+            return (1, [])
+
+    # offset of the tiff header inside the APP1 segment of a JPEG
+    @staticmethod
+    def find_exif(f):
+        f.seek(2)
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # start of scan or end of image, there is no exif block
+            if marker[1] in (0xDA, 0xD9):
+                return None
+
+            length = struct.unpack(">H", f.read(2))[0]
+            if marker[1] == 0xE1 and length >= 8:
+                if f.read(6) == b"Exif\x00\x00":
+                    return f.tell()
+                f.seek(length - 8, os.SEEK_CUR)
+            else:
+                f.seek(length - 2, os.SEEK_CUR)
+
+    # walk the IFDs of a tiff structure starting at base
+    @staticmethod
+    def read_tiff(f, base, file_size):
+        f.seek(base)
+        head = f.read(8)
+        if head[:2] == b"II":
+            endian = "<"
+        elif head[:2] == b"MM":
+            endian = ">"
+        else:
+            return (1, [])
+
+        orientation = 1
+        previews = []
+
+        first = struct.unpack(endian + "I", head[4:8])[0]
+        pending = [first]
+        visited = set()
+        while len(pending) > 0 and len(visited) < PreviewReader.MAX_IFDS:
+            offset = pending.pop(0)
+            if offset == 0 or offset in visited or base + offset >= file_size:
+                continue
+            visited.add(offset)
+
+            tags, next_offset = PreviewReader.read_ifd(f, base, endian, offset)
+            pending.append(next_offset)
+            pending.extend(tags.get(PreviewReader.TAG_SUB_IFDS, []))
+            pending.extend(tags.get(PreviewReader.TAG_EXIF_IFD, []))
+
+            # the first IFD describes the main image
+            if offset == first and PreviewReader.TAG_ORIENTATION in tags:
+                value = tags[PreviewReader.TAG_ORIENTATION][0]
+                if 1 <= value <= 8:
+                    orientation = value
+
+            for start, length in PreviewReader.jpeg_ranges(tags):
+                start += base
+                if length <= 0 or start + length > file_size:
+                    continue
+
+                size = PreviewReader.jpeg_size(f, start, length)
+                if size is not None:
+                    previews.append((start, length) + size)
+
+        return (orientation, previews)
+
+    # tags of one IFD, values are lists of ints, returns (tags, next IFD offset)
+    @staticmethod
+    def read_ifd(f, base, endian, offset):
+        f.seek(base + offset)
+        count = struct.unpack(endian + "H", f.read(2))[0]
+        entries = f.read(count * 12)
+        next_offset = struct.unpack(endian + "I", f.read(4))[0]
+
+        tags = {}
+        for i in range(count):
+            tag, value_type, value_count, value = struct.unpack(
+                endian + "HHI4s", entries[i * 12 : i * 12 + 12]
+            )
+            # only the integer types are needed
+            if value_type not in (3, 4, 13) or value_count == 0 or value_count > 64:
+                continue
+
+            code = "H" if value_type == 3 else "I"
+            size = PreviewReader.TYPE_SIZES[value_type] * value_count
+            if size > 4:
+                position = f.tell()
+                f.seek(base + struct.unpack(endian + "I", value)[0])
+                value = f.read(size)
+                f.seek(position)
+
+            tags[tag] = list(struct.unpack(endian + code * value_count, value[:size]))
+
+        return (tags, next_offset)
+
+    # (offset, length) of the JPEG data an IFD points to
+    @staticmethod
+    def jpeg_ranges(tags):
+        ranges = []
+
+        if PreviewReader.TAG_JPEG_OFFSET in tags and PreviewReader.TAG_JPEG_LENGTH in tags:
+            ranges.append(
+                (
+                    tags[PreviewReader.TAG_JPEG_OFFSET][0],
+                    tags[PreviewReader.TAG_JPEG_LENGTH][0],
+                )
+            )
+
+        # a preview stored as a single JPEG strip
+        compression = tags.get(PreviewReader.TAG_COMPRESSION, [1])[0]
+        offsets = tags.get(PreviewReader.TAG_STRIP_OFFSETS, [])
+        counts = tags.get(PreviewReader.TAG_STRIP_BYTE_COUNTS, [])
+        if (
+            compression in PreviewReader.JPEG_COMPRESSIONS
+            and len(offsets) == 1
+            and len(counts) == 1
+        ):
+            ranges.append((offsets[0], counts[0]))
+
+        return ranges
+
+    # (width, height) from the SOF marker of a decodable JPEG, None otherwise
+    @staticmethod
+    def jpeg_size(f, start, length):
+        end = start + length
+
+        f.seek(start)
+        if f.read(2) != b"\xff\xd8":
+            return None
+
+        while f.tell() + 4 <= end:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                return None
+            # fill bytes
+            if marker[1] == 0xFF:
+                f.seek(-1, os.SEEK_CUR)
+                continue
+            if marker[1] == 0xDA:
+                return None
+
+            segment_length = struct.unpack(">H", f.read(2))[0]
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                if marker[1] not in PreviewReader.JPEG_SOF:
+                    return None
+
+                height, width = struct.unpack(">xHH", f.read(5))
+                if width == 0 or height == 0:
+                    return None
+                return (width, height)
+
+            f.seek(segment_length - 2, os.SEEK_CUR)
+
+        return None
+
+
+# print the previews of files
+# python exif.py file...
+if __name__ == "__main__":
+    for file_path in sys.argv[1:]:
+        orientation, previews = PreviewReader.previews(file_path)
+        print(file_path, "orientation:", orientation)
+        for offset, length, width, height in previews:
+            print("  %dx%d, %d bytes at %d" % (width, height, length, offset))
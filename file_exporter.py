@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+import os
+import shutil
+
+from PySide6.QtCore import QThread, Signal
+
+
+# copy files into a folder on a thread, pasted images are saved as png
+# existing files are kept, the copies get "name (2).ext" and so on
+class FileExporter(QThread):
+    # number of files written
+    done = Signal(int)
+
+    # entries: [(file path, source QImage or None), ...], the source is saved
+    # for pasted images that have no file
+    def __init__(self, folder, entries, parent=None):
+        super().__init__(parent)
+
+        self.folder = folder
+        self.entries = entries
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        count = 0
+        for file_path, source in self.entries:
+            if self.stopped:
+                break
+
+            try:
+                if len(file_path) > 0:
+                    target = FileExporter.unique_path(
+                        self.folder, os.path.basename(file_path)
+                    )
+                    shutil.copy2(file_path, target)
+                elif source is not None:
+                    target = FileExporter.unique_path(self.folder, "pasted.png")
+                    if not source.save(target, "PNG"):
+                        continue
+                else:
+                    continue
+            except OSError as e:
+                print("FileExporter: %s(%s)" % (file_path, e))
+                continue
+
+            count += 1
+
+        self.done.emit(count)
+
+    # a path in the folder that does not exist yet, "name (2).ext" and so on
+    @staticmethod
+    def unique_path(folder, name):
+        path = os.path.join(folder, name)
+        base, ext = os.path.splitext(name)
+
+        number = 2
+        while os.path.exists(path):
+            path = os.path.join(folder, "%s (%d)%s" % (base, number, ext))
+            number += 1
+
+        return path
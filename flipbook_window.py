@@ -0,0 +1,390 @@
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+
+from PySide6 import QtGui, QtWidgets
+from PySide6.QtCore import Qt, QRect, QRunnable, QSize, QThread, QThreadPool, QTimer
+
+from base_window import BaseWindow
+from image_helper import ImageHelper
+
+
+# decoded frames of a sequence, a ring of CAPACITY slots ahead of the playhead
+# frame numbers keep growing while the sequence loops, frame n shows file n % count
+# decoders claim the next frame to decode and wait while the ring is full,
+# a sequence that fits in the ring is decoded once and kept
+class FrameBuffer:
+    CAPACITY = 48
+
+    def __init__(self, file_paths, width, height, ratio):
+        self.file_paths = file_paths
+        self.capacity = FrameBuffer.CAPACITY
+        # all the files fit, slots are indexed by file
+        self.resident = len(file_paths) <= self.capacity
+
+        self.condition = threading.Condition()
+        # (frame, QImage) or None
+        self.slots = [None] * self.capacity
+        # first frame still needed and the next frame to decode
+        self.position = 0
+        self.next = 0
+        self.stopped = False
+
+        self.width = width
+        self.height = height
+        self.ratio = ratio
+
+    # frame size in device independent pixels, later frames use it
+    def set_size(self, width, height, ratio):
+        with self.condition:
+            self.width = width
+            self.height = height
+            self.ratio = ratio
+
+    # next frame for a decoder, blocks while the ring is full
+    # returns (frame, file path, width, height, ratio) or None when stopped
+    def claim(self):
+        with self.condition:
+            while not self.stopped:
+                if self.resident:
+                    if self.next < len(self.file_paths):
+                        break
+                else:
+                    self.next = max(self.next, self.position)
+                    if self.next < self.position + self.capacity:
+                        break
+                self.condition.wait()
+
+            if self.stopped:
+                return None
+
+            frame = self.next
+            self.next += 1
+            return (
+                frame,
+                self.file_paths[frame % len(self.file_paths)],
+                self.width,
+                self.height,
+                self.ratio,
+            )
+
+    # a decoded frame, frames the playhead has passed are dropped
+    def put(self, frame, image):
+        with self.condition:
+            if not self.resident and frame < self.position:
+                return
+            self.slots[frame % self.capacity] = (frame, image)
+
+    # decoded image of a frame or None
+    def get(self, frame):
+        if self.resident:
+            frame = frame % len(self.file_paths)
+
+        with self.condition:
+            slot = self.slots[frame % self.capacity]
+            if slot is None or slot[0] != frame:
+                return None
+            return slot[1]
+
+    # move the playhead, the slots behind it are free for the decoders
+    def advance(self, position):
+        if self.resident:
+            return
+
+        with self.condition:
+            if position <= self.position:
+                return
+            self.position = position
+            self.condition.notify_all()
+
+    # decoded frames at and after the playhead
+    def buffered(self):
+        with self.condition:
+            if self.resident:
+                return len([slot for slot in self.slots if slot is not None])
+
+            return len(
+                [
+                    slot
+                    for slot in self.slots
+                    if slot is not None and slot[0] >= self.position
+                ]
+            )
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    # free the decoded frames, called once the decoders are done
+    def clear(self):
+        with self.condition:
+            self.slots = [None] * self.capacity
+
+
+# decode frames until the buffer is stopped
+# the frames are converted to the screen format so painting is a plain copy
+class FrameDecoder(QRunnable):
+    def __init__(self, buffer):
+        super().__init__()
+        self.buffer = buffer
+
+    def run(self):
+        while True:
+            job = self.buffer.claim()
+            if job is None:
+                return
+
+            frame, file_path, width, height, ratio = job
+            try:
+                image = ImageHelper.read_fitted(file_path, width, height, ratio)
+            except Exception as e:
+                print("FrameDecoder: %s(%s)" % (file_path, e))
+                image = QtGui.QImage()
+
+            if not image.isNull():
+                image = image.convertToFormat(
+                    QtGui.QImage.Format_ARGB32_Premultiplied
+                    if image.hasAlphaChannel()
+                    else QtGui.QImage.Format_RGB32
+                )
+            self.buffer.put(frame, image)
+
+
+# paint the current frame centered on black
+class FlipbookView(QtWidgets.QWidget):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = None
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+
+    def set_image(self, image):
+        self.image = image
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), Qt.black)
+
+        if self.image is None or self.image.isNull():
+            return
+
+        # frames decoded before a resize are scaled until the new ones arrive
+        size = QSize(
+            int(self.image.width() / self.image.devicePixelRatio()),
+            int(self.image.height() / self.image.devicePixelRatio()),
+        )
+        if size.width() > self.width() or size.height() > self.height():
+            size.scale(self.width(), self.height(), Qt.KeepAspectRatio)
+        target = QRect(
+            (self.width() - size.width()) // 2,
+            (self.height() - size.height()) // 2,
+            size.width(),
+            size.height(),
+        )
+        painter.drawImage(target, self.image)
+
+
+# play files as a sequence at a fixed frame rate
+# the frames are decoded ahead by parallel decoders into a FrameBuffer,
+# the playhead follows the clock, frames that are not decoded in time are skipped
+# and counted as dropped
+class FlipbookWindow(BaseWindow):
+    FRAME_RATES = [24, 30, 60]
+
+    def __init__(self, parent, file_paths, fps=24):
+        super().__init__(parent)
+
+        self.file_paths = file_paths
+        self.fps = fps
+
+        self.view = FlipbookView()
+
+        self.btn_play = QtWidgets.QPushButton()
+        self.btn_play.setFixedWidth(80)
+        self.btn_play.clicked.connect(self.on_play)
+
+        self.fps_box = QtWidgets.QComboBox()
+        for rate in FlipbookWindow.FRAME_RATES:
+            self.fps_box.addItem("%d fps" % rate, rate)
+        if fps in FlipbookWindow.FRAME_RATES:
+            self.fps_box.setCurrentIndex(FlipbookWindow.FRAME_RATES.index(fps))
+        self.fps_box.currentIndexChanged.connect(self.on_fps_changed)
+
+        self.lbl_status = QtWidgets.QLabel()
+
+        tool_layout = QtWidgets.QHBoxLayout()
+        tool_layout.addWidget(self.btn_play)
+        tool_layout.addWidget(self.fps_box)
+        tool_layout.addWidget(self.lbl_status)
+        tool_layout.addStretch()
+
+        self.base_layout = QtWidgets.QVBoxLayout()
+        self.base_layout.addWidget(self.view)
+        self.base_layout.addLayout(tool_layout)
+        self.set_body_layout(self.base_layout)
+
+        self.setStyleSheet("QDialog{border:1px solid; border-color:#4f5b62}")
+        self.set_title(
+            FlipbookWindow.tr("title_flipbook") + "  " + str(len(file_paths))
+        )
+
+        self.buffer = FrameBuffer(file_paths, 800, 600, self.devicePixelRatioF())
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+        self.decoding = False
+
+        # playhead, clock start and the frame shown at that time
+        self.playing = True
+        self.started = None
+        self.start_frame = 0
+        self.shown = -1
+        # counters since the last start
+        self.dropped = 0
+        self.shown_count = 0
+        self.stats_time = time.monotonic()
+        self.stats_count = 0
+        self.measured_fps = 0.0
+
+        # the clock is sampled twice per frame
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.on_tick)
+
+        self.update_play_button()
+        self.restart_timer()
+
+        self.show_max(False)
+        self.show_restore(True)
+        self.showMaximized()
+
+    def restart_timer(self):
+        self.timer.start(max(1, int(500 / self.fps)))
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.buffer.set_size(
+            self.view.width(), self.view.height(), self.devicePixelRatioF()
+        )
+
+    def done(self, result):
+        self.stop()
+        super().done(result)
+
+    # the decoders start at the first tick, the view has its size by then
+    def start_decoders(self):
+        self.decoding = True
+        self.buffer.set_size(
+            self.view.width(), self.view.height(), self.devicePixelRatioF()
+        )
+        for _ in range(self.pool.maxThreadCount()):
+            self.pool.start(FrameDecoder(self.buffer))
+
+    # stop the decoders and free the frames, the window cannot play again
+    def stop(self):
+        self.timer.stop()
+        self.buffer.stop()
+        self.pool.waitForDone()
+        self.buffer.clear()
+        self.view.set_image(None)
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Space:
+            self.on_play()
+        else:
+            super().keyPressEvent(event)
+
+    def on_play(self):
+        self.playing = not self.playing
+        # the clock starts again from the shown frame
+        self.started = None
+        self.update_play_button()
+
+    def update_play_button(self):
+        self.btn_play.setText(
+            FlipbookWindow.tr("title_pause" if self.playing else "title_play")
+        )
+
+    def on_fps_changed(self, index):
+        self.fps = FlipbookWindow.FRAME_RATES[index]
+        self.started = None
+        self.restart_timer()
+
+    def on_tick(self):
+        now = time.monotonic()
+        if not self.decoding:
+            self.start_decoders()
+
+        if self.playing:
+            if self.started is None:
+                self.start_clock(now)
+            else:
+                self.play(now)
+
+        if now - self.stats_time >= 0.5:
+            self.measured_fps = self.stats_count / (now - self.stats_time)
+            self.stats_time = now
+            self.stats_count = 0
+            self.update_status()
+
+    # the clock starts once the buffer is half full, or the first time
+    # the next frame is ready after a pause
+    def start_clock(self, now):
+        frame = self.shown + 1
+        if self.shown < 0:
+            ready = self.buffer.buffered() >= min(
+                FrameBuffer.CAPACITY // 2, len(self.file_paths)
+            )
+        else:
+            ready = self.buffer.get(frame) is not None
+        if not ready:
+            return
+
+        self.started = now
+        self.start_frame = frame
+        self.show_frame(frame)
+
+    def play(self, now):
+        frame = self.start_frame + int((now - self.started) * self.fps)
+        if frame <= self.shown:
+            return
+
+        # the decoders skip the frames the clock has passed
+        self.buffer.advance(frame)
+        # late, the frame stays until a later one is ready
+        if self.buffer.get(frame) is None:
+            return
+
+        self.dropped += frame - self.shown - 1
+        self.show_frame(frame)
+
+    def show_frame(self, frame):
+        image = self.buffer.get(frame)
+        if image is None:
+            return
+
+        self.shown = frame
+        self.shown_count += 1
+        self.stats_count += 1
+        self.view.set_image(image)
+
+    def update_status(self):
+        if self.shown < 0:
+            position = 0
+        else:
+            position = self.shown % len(self.file_paths) + 1
+
+        self.lbl_status.setText(
+            "%d/%d  %.1f fps  %s %d  %s %d/%d"
+            % (
+                position,
+                len(self.file_paths),
+                self.measured_fps,
+                FlipbookWindow.tr("title_dropped"),
+                self.dropped,
+                FlipbookWindow.tr("title_buffered"),
+                self.buffer.buffered(),
+                min(FrameBuffer.CAPACITY, len(self.file_paths)),
+            )
+        )
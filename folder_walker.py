@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+
+from PySide6.QtCore import QThread, Signal
+
+from image_helper import ImageHelper
+from metadata_index import MetadataIndex
+
+
+# walk files and folder trees on a thread and send the supported images in chunks
+# the headers are probed here, the GUI thread only inserts the tiles
+# at most MAX_PENDING chunks wait for the GUI, the walk pauses until they are consumed
+class FolderWalker(QThread):
+    # [(file path, probe result), ...]
+    found = Signal(object)
+    # number of files found
+    done = Signal(int)
+
+    CHUNK_SIZE = 256
+    MAX_PENDING = 4
+
+    # file_paths: files and folders, in the order they are added
+    def __init__(self, file_paths, parent=None):
+        super().__init__(parent)
+
+        self.file_paths = file_paths
+        self.count = 0
+        self.stopped = False
+        self.pending = threading.Semaphore(FolderWalker.MAX_PENDING)
+
+    # called by the GUI thread after a chunk is inserted
+    def consumed(self):
+        self.pending.release()
+
+    def stop(self):
+        self.stopped = True
+        self.pending.release()
+
+    def run(self):
+        index = MetadataIndex.instance()
+        chunk = []
+
+        for file_path in self.paths():
+            if self.stopped:
+                return
+
+            chunk.append((file_path, index.get(file_path)))
+            # animated or not, the GUI thread reads it from the cache
+            ImageHelper.sniff(file_path)
+            if len(chunk) >= FolderWalker.CHUNK_SIZE:
+                self.send(chunk)
+                chunk = []
+
+        if len(chunk) > 0:
+            self.send(chunk)
+
+        index.save()
+        if not self.stopped:
+            self.done.emit(self.count)
+
+    def send(self, chunk):
+        self.pending.acquire()
+        if self.stopped:
+            return
+
+        self.count += len(chunk)
+        self.found.emit(chunk)
+
+    # the files, and the images of the folders in place
+    def paths(self):
+        for file_path in self.file_paths:
+            if os.path.isdir(file_path):
+                yield from FolderWalker.walk(file_path)
+            elif ImageHelper.is_supported(file_path):
+                yield file_path
+
+    # supported images below a folder, depth first in name order
+    # directories are listed one at a time, the tree is never held in memory
+    @staticmethod
+    def walk(folder):
+        folders = [folder]
+        while len(folders) > 0:
+            folder = folders.pop()
+
+            files = []
+            sub_folders = []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                if not entry.name.startswith("."):
+                                    sub_folders.append(entry.path)
+                            elif entry.is_file() and ImageHelper.is_supported(entry.name):
+                                files.append(entry.path)
+                        except OSError:
+                            continue
+            except OSError as e:
+                print("FolderWalker: skip %s(%s)" % (folder, e))
+                continue
+
+            files.sort(key=lambda path: os.path.basename(path).lower())
+            for file_path in files:
+                yield file_path
+
+            # popped from the end, the first folder by name is visited next
+            sub_folders.sort(key=lambda path: os.path.basename(path).lower(), reverse=True)
+            folders.extend(sub_folders)
@@ -68,6 +68,14 @@ class MenuIcon:
     def get_open_file():
         return qta.icon("mdi6.file-image", color="#a1887f")
 
+    @staticmethod
+    def get_open_folder():
+        return qta.icon("mdi6.folder-image", color="#a1887f")
+
+    @staticmethod
+    def get_flipbook():
+        return qta.icon("mdi6.play-box-multiple-outline", color="#a1887f")
+
     @staticmethod
     def get_remove_file():
         return qta.icon("mdi6.image-remove", color="#a1887f")
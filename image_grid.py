@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+import bisect
+
+from PySide6.QtCore import QRect
+
+from image_helper import ImageHelper
+
+
+# one image of the grid
+# image: QPixmap/QMovie, None while the file is decoding
+class ImageItem:
+    def __init__(self, file_path, image_type, image=None):
+        self.file_path = file_path or ""
+        self.image_type = image_type
+        self.image = image
+        self.orig_width = 0
+        self.orig_height = 0
+        self.task_id = None
+        # the file could not be decoded, do not try again
+        self.failed = False
+        # (tile width, tile height, pixel ratio) the image was made for,
+        # and the one of the running load
+        self.tile_key = None
+        self.load_key = None
+        # full image of a pasted item, it has no file to decode again
+        self.source = None
+
+    def set_orig_size(self, width, height):
+        self.orig_width = width
+        self.orig_height = height
+
+    def is_portrait(self):
+        return self.orig_height > self.orig_width
+
+
+# selected grid positions, bit i of an int is the item at index i
+# the bits follow the items when they are removed or swapped
+class GridSelection:
+    def __init__(self):
+        self.bits = 0
+        # index a shift click extends from
+        self.anchor = -1
+
+    def is_selected(self, index):
+        return (self.bits >> index) & 1 == 1
+
+    def is_empty(self):
+        return self.bits == 0
+
+    def count(self):
+        return bin(self.bits).count("1")
+
+    # selected indexes in ascending order
+    def indexes(self):
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+    def select(self, index):
+        self.bits = 1 << index
+        self.anchor = index
+
+    def toggle(self, index):
+        self.bits ^= 1 << index
+        self.anchor = index
+
+    # bits of the indexes first to last, both included
+    @staticmethod
+    def range_bits(first, last):
+        if first > last:
+            first, last = last, first
+        return ((1 << (last + 1)) - 1) ^ ((1 << first) - 1)
+
+    # select from the anchor to index, added to the selection with add
+    def select_range(self, index, add=False):
+        anchor = self.anchor if self.anchor >= 0 else index
+        bits = GridSelection.range_bits(anchor, index)
+        self.bits = self.bits | bits if add else bits
+
+    def select_all(self, count):
+        self.bits = (1 << count) - 1
+
+    def clear(self):
+        self.bits = 0
+        self.anchor = -1
+
+    # the item at index was removed, the bits above it move down
+    def remove(self, index):
+        low = self.bits & ((1 << index) - 1)
+        self.bits = low | ((self.bits >> (index + 1)) << index)
+        if self.anchor == index:
+            self.anchor = -1
+        elif self.anchor > index:
+            self.anchor -= 1
+
+    def swap(self, index, other):
+        if self.is_selected(index) != self.is_selected(other):
+            self.bits ^= (1 << index) | (1 << other)
+
+
+# cell positions of the grid, computed from the items without any widget
+# columns have the tile width, a row is as high as its tallest tile
+class GridGeometry:
+    def __init__(self, fix_width, fix_height, column_count, spacing=8, margin=9):
+        self.fix_width = int(fix_width)
+        self.fix_height = int(fix_height)
+        self.column_count = max(1, column_count)
+        self.spacing = spacing
+        self.margin = margin
+        self.count = 0
+        # top of every row, the last entry is the bottom of the grid
+        self.row_tops = [margin]
+
+    def set_tile_size(self, fix_width, fix_height, column_count):
+        self.fix_width = int(fix_width)
+        self.fix_height = int(fix_height)
+        self.column_count = max(1, column_count)
+
+    # rebuild the row positions from the row of the item at first on,
+    # the rows above it keep their positions
+    def update(self, items, first=0):
+        self.count = len(items)
+
+        row = max(0, min(first // self.column_count, len(self.row_tops) - 1))
+        del self.row_tops[row + 1 :]
+
+        top = self.row_tops[row]
+        for start in range(row * self.column_count, self.count, self.column_count):
+            row = items[start : start + self.column_count]
+            if any(item.is_portrait() for item in row):
+                top += self.fix_width + self.spacing
+            else:
+                top += self.fix_height + self.spacing
+            self.row_tops.append(top)
+
+    def width(self):
+        return (
+            self.margin * 2
+            + self.column_count * self.fix_width
+            + (self.column_count - 1) * self.spacing
+        )
+
+    def height(self):
+        return self.row_tops[-1] + self.margin
+
+    # rectangle of the item at index, portrait tiles are centered in the column
+    def cell_rect(self, index, item):
+        row = index // self.column_count
+        column = index % self.column_count
+
+        width, height = ImageHelper.tile_size(
+            item.orig_width, item.orig_height, self.fix_width, self.fix_height
+        )
+        left = self.margin + column * (self.fix_width + self.spacing)
+        left += (self.fix_width - width) // 2
+
+        return QRect(left, self.row_tops[row], width, height)
+
+    # index of the cell at a point, -1 outside the columns and rows
+    # portrait tiles do not fill their cell, check cell_rect too
+    def index_at(self, x, y):
+        row = bisect.bisect_right(self.row_tops, y) - 1
+        if row < 0 or row >= len(self.row_tops) - 1 or x < self.margin:
+            return -1
+
+        column = (x - self.margin) // (self.fix_width + self.spacing)
+        if column >= self.column_count:
+            return -1
+
+        index = row * self.column_count + column
+        return index if index < self.count else -1
+
+    # index range [first, last) of the items between top and bottom
+    def index_range(self, top, bottom):
+        row_count = len(self.row_tops) - 1
+        if row_count <= 0:
+            return (0, 0)
+
+        first_row = max(0, bisect.bisect_right(self.row_tops, top) - 1)
+        last_row = min(row_count, bisect.bisect_left(self.row_tops, bottom))
+
+        first = first_row * self.column_count
+        last = min(self.count, last_row * self.column_count)
+
+        return (first, max(first, last))
@@ -0,0 +1,658 @@
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import threading
+from PySide6 import QtGui, QtSvg
+from PySide6.QtCore import Qt, QBuffer, QByteArray, QIODevice, QSize
+
+from exif import PreviewReader
+from thumbnail_cache import ImageCache, ThumbnailCache
+
+
+# image type
+class ImageType:
+    GIF = 1
+    SVG = 2
+    WEBP = 3
+    Default = 0
+
+
+class ImageHelper:
+    # RAW files are shown through their embedded JPEG preview
+    RAW_EXTENSIONS = [".cr2", ".nef", ".dng", ".arw"]
+    EXTENSIONS = [
+        ".jpg",
+        ".jpeg",
+        ".png",
+        ".bmp",
+        ".gif",
+        ".svg",
+        ".webp",
+    ] + RAW_EXTENSIONS
+
+    # exif orientation of the (rotate 90, mirror, flip) flags of QImageIOHandler
+    ORIENTATIONS = {
+        (False, False, False): 1,
+        (False, True, False): 2,
+        (False, True, True): 3,
+        (False, False, True): 4,
+        (True, True, False): 5,
+        (True, False, False): 6,
+        (True, False, True): 7,
+        (True, True, True): 8,
+    }
+
+    @staticmethod
+    def is_supported(file_path):
+        ext = os.path.splitext(file_path)[1]
+        return ext.lower() in ImageHelper.EXTENSIONS
+
+    @staticmethod
+    def is_raw(file_path):
+        ext = os.path.splitext(file_path)[1]
+        return ext.lower() in ImageHelper.RAW_EXTENSIONS
+
+    # sniff results, abspath -> (mtime_ns, size, (format, animated))
+    _sniffed = {}
+    _sniff_lock = threading.Lock()
+    MAX_SNIFFED = 65536
+
+    # animated gif/webp, played with QMovie
+    # single frame files use the still image path whatever their extension is
+    @staticmethod
+    def is_gif(file_path):
+        return ImageHelper.sniff(file_path)[1]
+
+    # format from the magic bytes and whether the file has more than one frame
+    # returns (format, animated), format is "" when it is not recognized
+    # the result is cached until the file changes
+    @staticmethod
+    def sniff(file_path):
+        try:
+            path = os.path.abspath(file_path)
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return ("", False)
+
+        with ImageHelper._sniff_lock:
+            entry = ImageHelper._sniffed.get(path)
+        if (
+            entry is not None
+            and entry[0] == stat.st_mtime_ns
+            and entry[1] == stat.st_size
+        ):
+            return entry[2]
+
+        try:
+            with open(path, "rb") as f:
+                result = ImageHelper.sniff_file(f)
+        except (OSError, IndexError, struct.error):
+            result = ("", False)
+
+        with ImageHelper._sniff_lock:
+            if len(ImageHelper._sniffed) >= ImageHelper.MAX_SNIFFED:
+                ImageHelper._sniffed.clear()
+            ImageHelper._sniffed[path] = (stat.st_mtime_ns, stat.st_size, result)
+
+        return result
+
+    @staticmethod
+    def sniff_file(f):
+        head = f.read(32)
+
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return ("gif", ImageHelper.gif_frames(f, 2) > 1)
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            # extended format with the animation flag
+            animated = head[12:16] == b"VP8X" and bool(head[20] & 0x02)
+            return ("webp", animated)
+        if head[:8] == b"\x89PNG\r\n\x1a\n":
+            return ("png", False)
+        if head[:3] == b"\xff\xd8\xff":
+            return ("jpeg", False)
+        if head[:2] == b"BM":
+            return ("bmp", False)
+        if head[:4] in (b"II*\x00", b"MM\x00*"):
+            return ("tiff", False)
+        if b"<svg" in head or head.lstrip()[:5] == b"<?xml":
+            return ("svg", False)
+
+        return ("", False)
+
+    # number of frames of a gif, counting stops at limit
+    @staticmethod
+    def gif_frames(f, limit):
+        f.seek(10)
+        flags = f.read(3)[0]
+        # global color table
+        if flags & 0x80:
+            f.seek(3 << ((flags & 0x07) + 1), os.SEEK_CUR)
+
+        frames = 0
+        while frames < limit:
+            block = f.read(1)
+            # trailer or truncated file
+            if len(block) == 0 or block == b"\x3b":
+                break
+
+            if block == b"\x2c":
+                frames += 1
+                descriptor = f.read(9)
+                if len(descriptor) < 9:
+                    break
+                # local color table
+                if descriptor[8] & 0x80:
+                    f.seek(3 << ((descriptor[8] & 0x07) + 1), os.SEEK_CUR)
+                # lzw minimum code size
+                f.seek(1, os.SEEK_CUR)
+            elif block == b"\x21":
+                # extension label
+                f.seek(1, os.SEEK_CUR)
+            else:
+                break
+
+            # data sub-blocks
+            while True:
+                size = f.read(1)
+                if len(size) == 0 or size[0] == 0:
+                    break
+                f.seek(size[0], os.SEEK_CUR)
+
+        return frames
+
+    @staticmethod
+    def is_svg(file_path):
+        ext = os.path.splitext(file_path)[1]
+        if ext.lower() == ".svg":
+            return True
+        return False
+
+    @staticmethod
+    def image_from(file_path, width = None):
+        if ImageHelper.is_gif(file_path):
+            image_type = ImageType.GIF
+            image = QtGui.QMovie(file_path)
+            # decode the first frame only, playback is started by the caller
+            image.jumpToFrame(0)
+        elif ImageHelper.is_svg(file_path):
+            image_type = ImageType.SVG
+            image = ImageHelper.svg_image(file_path, width)[0]
+        elif ImageHelper.is_raw(file_path):
+            image_type = ImageType.Default
+            image = ImageHelper.read_image(file_path)
+        else:
+            image_type = ImageType.Default
+            image = QtGui.QImage(file_path)
+
+        return (image_type, image)
+
+    @staticmethod
+    def image_type(image_tuple):
+        if image_tuple is None or len(image_tuple) < 1:
+            return None
+
+        return image_tuple[0]
+
+    @staticmethod
+    def image(image_tuple):
+        if image_tuple is None or len(image_tuple) < 2:
+            return None
+
+        return image_tuple[1]
+
+    # decoded tile from the thumbnail cache
+    # returns (image, original width, original height) or None
+    @staticmethod
+    def image_cached(file_path, fix_width, fix_height, ratio=1.0):
+        entry = ThumbnailCache.instance().get(
+            file_path, int(fix_width * ratio), int(fix_height * ratio)
+        )
+        if entry is not None:
+            entry[0].setDevicePixelRatio(ratio)
+
+        return entry
+
+    # decode a still image at tile size instead of full resolution
+    # the reader scales while decoding, JPEG uses DCT scaling for this
+    # tiles decoded before are read from the thumbnail cache
+    # returns (image, original width, original height)
+    @staticmethod
+    def image_scaled(file_path, fix_width, fix_height, ratio=1.0):
+        entry = ImageHelper.image_cached(file_path, fix_width, fix_height, ratio)
+        if entry is not None:
+            return entry
+
+        image, orig_width, orig_height = ImageHelper.read_tile(
+            file_path, fix_width, fix_height, ratio
+        )
+        if image.isNull():
+            return (image, orig_width, orig_height)
+
+        ThumbnailCache.instance().put(
+            file_path,
+            int(fix_width * ratio),
+            int(fix_height * ratio),
+            image,
+            orig_width,
+            orig_height,
+        )
+
+        return (image, orig_width, orig_height)
+
+    # tile from the thumbnail embedded in the exif block or the RAW file,
+    # only the headers and the small JPEG are read, it is not cached
+    # returns (image, original width, original height) or None
+    @staticmethod
+    def image_embedded(file_path, fix_width, fix_height, ratio=1.0):
+        preview = PreviewReader.thumbnail(file_path)
+        if preview is None:
+            return None
+
+        data, orientation = preview
+        image = QtGui.QImage.fromData(data)
+        if image.isNull():
+            return None
+        image = ImageHelper.oriented(image, orientation)
+
+        orig_width, orig_height = ImageHelper.image_size(file_path)
+        if orig_width <= 0 or orig_height <= 0:
+            orig_width = image.width()
+            orig_height = image.height()
+
+        # exif thumbnails are 160x120, other aspect ratios are letterboxed
+        width = min(image.width(), image.height() * orig_width // orig_height)
+        height = min(image.height(), image.width() * orig_height // orig_width)
+        if width < image.width() - 1 or height < image.height() - 1:
+            image = image.copy(
+                (image.width() - width) // 2,
+                (image.height() - height) // 2,
+                width,
+                height,
+            )
+
+        ratio *= 0.5
+        width, height = ImageHelper.tile_size(
+            orig_width, orig_height, fix_width, fix_height
+        )
+        image = image.scaled(
+            max(1, int(width * ratio)),
+            max(1, int(height * ratio)),
+            aspectMode=Qt.IgnoreAspectRatio,
+            mode=Qt.SmoothTransformation,
+        )
+        image.setDevicePixelRatio(ratio)
+
+        return (image, orig_width, orig_height)
+
+    # quick low quality tile for progressive display, it is not cached
+    # JPEG decodes with the fast DCT straight to half the tile size
+    # returns (image, original width, original height) or None for formats
+    # without scaled decoding, a preview would cost as much as the tile there
+    @staticmethod
+    def image_preview(file_path, fix_width, fix_height, ratio=1.0):
+        reader, device, orientation = ImageHelper.image_reader(file_path)
+        if not reader.supportsOption(QtGui.QImageIOHandler.ScaledSize):
+            return None
+
+        image, orig_width, orig_height = ImageHelper.read_tile(
+            file_path, fix_width, fix_height, ratio * 0.5, fast=True
+        )
+        if image.isNull():
+            return None
+
+        return (image, orig_width, orig_height)
+
+    # decode a still image at tile size in device pixels
+    # fast: fast DCT and fast scaling, used for previews
+    # returns (image, original width, original height)
+    @staticmethod
+    def read_tile(file_path, fix_width, fix_height, ratio=1.0, fast=False):
+        reader, device, orientation = ImageHelper.image_reader(file_path)
+        if fast:
+            reader.setQuality(0)
+
+        image = None
+        orig_size = reader.size()
+        if orig_size.isValid():
+            # the exif orientation is applied after scaling
+            if device is None:
+                rotated = bool(
+                    reader.transformation()
+                    & QtGui.QImageIOHandler.TransformationRotate90
+                )
+            else:
+                rotated = orientation >= 5
+            if rotated:
+                orig_size.transpose()
+        else:
+            # no size in the header, decode at full size
+            image = ImageHelper.oriented(reader.read(), orientation)
+            orig_size = image.size()
+
+        orig_width = orig_size.width()
+        orig_height = orig_size.height()
+
+        width, height = ImageHelper.tile_size(
+            orig_width, orig_height, fix_width, fix_height
+        )
+        width = max(1, int(width * ratio))
+        height = max(1, int(height * ratio))
+
+        if image is None:
+            # only shrink while decoding, small images are scaled up afterwards
+            if width < orig_width and height < orig_height:
+                scaled_size = QSize(width, height)
+                if rotated:
+                    scaled_size.transpose()
+                reader.setScaledSize(scaled_size)
+
+            image = ImageHelper.oriented(reader.read(), orientation)
+
+        if image.isNull():
+            return (image, orig_width, orig_height)
+
+        if image.width() != width or image.height() != height:
+            image = image.scaled(
+                width,
+                height,
+                aspectMode=Qt.IgnoreAspectRatio,
+                mode=Qt.FastTransformation if fast else Qt.SmoothTransformation,
+            )
+        image.setDevicePixelRatio(ratio)
+
+        return (image, orig_width, orig_height)
+
+    # image in the format the raster paint engine blits without converting,
+    # done on the worker threads so QPixmap.fromImage does not convert on the GUI thread
+    @staticmethod
+    def paint_image(image):
+        if image.isNull():
+            return image
+
+        if image.hasAlphaChannel():
+            image_format = QtGui.QImage.Format_ARGB32_Premultiplied
+        else:
+            image_format = QtGui.QImage.Format_RGB32
+        if image.format() == image_format:
+            return image
+
+        return image.convertToFormat(image_format)
+
+    # still image fitted into width x height with the aspect ratio kept,
+    # decoded in device pixels, small images are not scaled up
+    @staticmethod
+    def read_fitted(file_path, width, height, ratio=1.0):
+        reader, device, orientation = ImageHelper.image_reader(file_path)
+        width = max(1, int(width * ratio))
+        height = max(1, int(height * ratio))
+
+        size = reader.size()
+        if size.isValid():
+            if device is None:
+                rotated = bool(
+                    reader.transformation()
+                    & QtGui.QImageIOHandler.TransformationRotate90
+                )
+            else:
+                rotated = orientation >= 5
+            if rotated:
+                size.transpose()
+
+            # only shrink while decoding
+            scale = min(width / size.width(), height / size.height())
+            if scale < 1:
+                scaled_size = QSize(
+                    max(1, int(size.width() * scale)), max(1, int(size.height() * scale))
+                )
+                if rotated:
+                    scaled_size.transpose()
+                reader.setScaledSize(scaled_size)
+
+        image = ImageHelper.oriented(reader.read(), orientation)
+        if image.isNull():
+            return image
+
+        # no size in the header
+        if image.width() > width or image.height() > height:
+            image = image.scaled(
+                width, height, Qt.KeepAspectRatio, Qt.SmoothTransformation
+            )
+        image.setDevicePixelRatio(ratio)
+
+        return image
+
+    # reader of a still image, RAW files are read from their largest embedded preview
+    # the exif orientation of RAW files is not in the preview, it is returned
+    # for ImageHelper.oriented, the device has to be kept while the reader is used
+    # returns (reader, device or None, exif orientation)
+    @staticmethod
+    def image_reader(file_path):
+        if not ImageHelper.is_raw(file_path):
+            reader = QtGui.QImageReader(file_path)
+            reader.setAutoTransform(True)
+            return (reader, None, 1)
+
+        data = b""
+        orientation = 1
+        preview = PreviewReader.largest(file_path)
+        if preview is not None:
+            data, orientation = preview
+
+        device = QBuffer()
+        device.setData(QByteArray(data))
+        device.open(QIODevice.ReadOnly)
+
+        reader = QtGui.QImageReader(device)
+        reader.setAutoTransform(False)
+        return (reader, device, orientation)
+
+    # full size still image, RAW files give their largest embedded preview
+    @staticmethod
+    def read_image(file_path):
+        reader, device, orientation = ImageHelper.image_reader(file_path)
+        return ImageHelper.oriented(reader.read(), orientation)
+
+    # size of a still image with the orientation applied, read from the headers
+    @staticmethod
+    def image_size(file_path):
+        if ImageHelper.is_raw(file_path):
+            return PreviewReader.size(file_path)
+
+        reader = QtGui.QImageReader(file_path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if not size.isValid():
+            return (0, 0)
+        if reader.transformation() & QtGui.QImageIOHandler.TransformationRotate90:
+            size.transpose()
+
+        return (size.width(), size.height())
+
+    # read format, size, frame count and orientation from the headers only
+    # returns (format, width, height, frame count, exif orientation),
+    # the size has the orientation applied, format is "" for unreadable files
+    @staticmethod
+    def probe(file_path):
+        if ImageHelper.is_svg(file_path):
+            render = QtSvg.QSvgRenderer(file_path)
+            if not render.isValid():
+                return ("", 0, 0, 0, 1)
+            width, height = ImageHelper.svg_size(render)
+            return ("svg", int(width), int(height), 1, 1)
+
+        if ImageHelper.is_raw(file_path):
+            orientation, previews = PreviewReader.previews(file_path)
+            if len(previews) == 0:
+                return ("", 0, 0, 0, 1)
+            width, height = PreviewReader.size(file_path)
+            return ("raw", width, height, 1, orientation)
+
+        reader = QtGui.QImageReader(file_path)
+        reader.setAutoTransform(True)
+        size = reader.size()
+        if not reader.canRead() or not size.isValid():
+            return ("", 0, 0, 0, 1)
+
+        transformation = reader.transformation()
+        rotated = bool(transformation & QtGui.QImageIOHandler.TransformationRotate90)
+        mirrored = bool(transformation & QtGui.QImageIOHandler.TransformationMirror)
+        flipped = bool(transformation & QtGui.QImageIOHandler.TransformationFlip)
+        orientation = ImageHelper.ORIENTATIONS[(rotated, mirrored, flipped)]
+        if rotated:
+            size.transpose()
+
+        frame_count = 1
+        if reader.supportsAnimation():
+            frame_count = max(1, reader.imageCount())
+
+        return (
+            bytes(reader.format().data()).decode("ascii", "ignore"),
+            size.width(),
+            size.height(),
+            frame_count,
+            orientation,
+        )
+
+    # apply an exif orientation(1-8) to an image
+    @staticmethod
+    def oriented(image, orientation):
+        if orientation <= 1 or image.isNull():
+            return image
+
+        if orientation in (2, 5, 7):
+            image = image.mirrored(True, False)
+        elif orientation == 4:
+            image = image.mirrored(False, True)
+
+        rotation = {3: 180, 5: 270, 6: 90, 7: 90, 8: 270}.get(orientation, 0)
+        if rotation != 0:
+            image = image.transformed(QtGui.QTransform().rotate(rotation))
+
+        return image
+
+    # QMovie decoding its frames at tile size instead of full resolution
+    # returns (movie, original width, original height)
+    @staticmethod
+    def movie_scaled(file_path, fix_width, fix_height, ratio=1.0):
+        orig_size = QtGui.QImageReader(file_path).size()
+        if not orig_size.isValid():
+            # no size in the header, decode the first frame to learn it
+            movie = QtGui.QMovie(file_path)
+            movie.jumpToFrame(0)
+            orig_size = movie.currentImage().size()
+            if not orig_size.isValid():
+                return (movie, 0, 0)
+
+        movie = QtGui.QMovie(file_path)
+
+        width, height = ImageHelper.tile_size(
+            orig_size.width(), orig_size.height(), fix_width, fix_height
+        )
+        width = int(width * ratio)
+        height = int(height * ratio)
+
+        # only shrink, small movies are scaled by the label
+        if width < orig_size.width() and height < orig_size.height():
+            movie.setScaledSize(QSize(width, height))
+
+        movie.jumpToFrame(0)
+
+        return (movie, orig_size.width(), orig_size.height())
+
+    # size of an svg, the view box or the default size when there is none
+    @staticmethod
+    def svg_size(render):
+        rect = render.viewBoxF()
+        if rect.isEmpty():
+            return (render.defaultSize().width(), render.defaultSize().height())
+
+        return (rect.width(), rect.height())
+
+    # rasterize an svg into a QImage, this works on worker threads too
+    @staticmethod
+    def svg_render(render, width, height):
+        image = QtGui.QImage(width, height, QtGui.QImage.Format_ARGB32_Premultiplied)
+        image.fill(Qt.transparent)
+
+        painter = QtGui.QPainter(image)
+        render.render(painter)
+        painter.end()
+
+        return image
+
+    # svg rasterized at a width, the natural size when width is None
+    # returns (image, original width, original height)
+    @staticmethod
+    def svg_image(file_path, width=None):
+        cache = ImageCache.instance()
+        key = ImageCache.key(file_path, width)
+
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+
+        render = QtSvg.QSvgRenderer(file_path)
+        orig_width, orig_height = ImageHelper.svg_size(render)
+        if orig_width <= 0 or orig_height <= 0:
+            return (QtGui.QImage(), 0, 0)
+
+        if width is None:
+            image_width = int(orig_width)
+            image_height = int(orig_height)
+        else:
+            image_width = int(width)
+            image_height = max(1, int(width * orig_height / orig_width))
+
+        image = ImageHelper.svg_render(render, image_width, image_height)
+        cache.put(key, image, int(orig_width), int(orig_height))
+
+        return (image, int(orig_width), int(orig_height))
+
+    # svg rasterized at tile size in device pixels
+    # returns (image, original width, original height)
+    @staticmethod
+    def svg_scaled(file_path, fix_width, fix_height, ratio=1.0):
+        cache_width = int(fix_width * ratio)
+        cache_height = int(fix_height * ratio)
+
+        cache = ImageCache.instance()
+        key = ImageCache.key(file_path, cache_width, cache_height)
+
+        entry = cache.get(key)
+        if entry is None:
+            entry = ThumbnailCache.instance().get(file_path, cache_width, cache_height)
+            if entry is not None:
+                entry[0].setDevicePixelRatio(ratio)
+                cache.put(key, *entry)
+        if entry is not None:
+            return entry
+
+        render = QtSvg.QSvgRenderer(file_path)
+        orig_width, orig_height = ImageHelper.svg_size(render)
+        if orig_width <= 0 or orig_height <= 0:
+            return (QtGui.QImage(), 0, 0)
+
+        orig_width = int(orig_width)
+        orig_height = int(orig_height)
+        width, height = ImageHelper.tile_size(
+            orig_width, orig_height, fix_width, fix_height
+        )
+
+        image = ImageHelper.svg_render(render, int(width * ratio), int(height * ratio))
+        image.setDevicePixelRatio(ratio)
+
+        cache.put(key, image, orig_width, orig_height)
+        ThumbnailCache.instance().put(
+            file_path, cache_width, cache_height, image, orig_width, orig_height
+        )
+
+        return (image, orig_width, orig_height)
+
+    # tile size for an image, portrait images swap width and height
+    @staticmethod
+    def tile_size(orig_width, orig_height, fix_width, fix_height):
+        if orig_height > orig_width:
+            return (int(fix_height), int(fix_width))
+
+        return (int(fix_width), int(fix_height))
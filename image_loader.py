@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import itertools
+import threading
+import time
+
+from PySide6.QtCore import QObject, QRunnable, QThread, QThreadPool, Signal
+
+from image_helper import ImageHelper, ImageType
+from mipmap_cache import MipmapCache
+from process_decoder import ProcessDecoder
+
+
+# priority classes of the load jobs, higher runs first
+# the viewer decodes on the pools of ZoomView, it does not queue here
+class LoadPriority:
+    VISIBLE = 2
+    PREFETCH = 1
+    IDLE = 0
+
+
+# decode one still image or svg on a worker thread
+# progressive tasks run in two stages: a quick preview first, then the smooth
+# tile is queued again, previews of a priority class run before its refinements
+class LoadTask(QRunnable):
+    PREVIEW = 1
+    FINAL = 0
+
+    def __init__(
+        self, loader, task_id, file_path, fix_width, fix_height, ratio, stage
+    ):
+        super().__init__()
+        # the loader keeps the task until it is finished
+        self.setAutoDelete(False)
+
+        self.loader = loader
+        self.task_id = task_id
+        self.file_path = file_path
+        self.fix_width = fix_width
+        self.fix_height = fix_height
+        self.ratio = ratio
+        self.stage = stage
+
+    def run(self):
+        if ImageHelper.is_svg(self.file_path):
+            image_type = ImageType.SVG
+            image, orig_width, orig_height = ImageHelper.svg_scaled(
+                self.file_path, self.fix_width, self.fix_height, self.ratio
+            )
+        elif self.stage == LoadTask.PREVIEW:
+            image_type = ImageType.Default
+
+            # nothing to refine for cached tiles
+            entry = ImageHelper.image_cached(
+                self.file_path, self.fix_width, self.fix_height, self.ratio
+            )
+            if entry is None:
+                self.preview()
+                return
+
+            image, orig_width, orig_height = entry
+        else:
+            image_type = ImageType.Default
+            image, orig_width, orig_height = ImageHelper.image_scaled(
+                self.file_path, self.fix_width, self.fix_height, self.ratio
+            )
+
+        image = ImageHelper.paint_image(image)
+        # smaller levels for tile size changes
+        MipmapCache.instance().put(self.file_path, image)
+
+        self.loader.finish(self, image_type, image, orig_width, orig_height)
+
+    # first stage, show a preview and queue the smooth tile
+    # the embedded exif/RAW thumbnail is used when there is one
+    def preview(self):
+        entry = ImageHelper.image_embedded(
+            self.file_path, self.fix_width, self.fix_height, self.ratio
+        )
+        if entry is None:
+            entry = ImageHelper.image_preview(
+                self.file_path, self.fix_width, self.fix_height, self.ratio
+            )
+        if entry is not None:
+            image, orig_width, orig_height = entry
+            entry = (ImageHelper.paint_image(image), orig_width, orig_height)
+
+        self.loader.refine(self, entry)
+
+
+# decode images in a thread pool and hand the QImage back to the GUI thread
+# only still images and svg are loaded here, QMovie belongs to the GUI thread
+# the jobs wait in a priority queue and only as many as there are threads are
+# handed to the pool, so queued jobs can be cancelled or reprioritized at any time
+# with decoder processes the still images are decoded by a ProcessDecoder instead,
+# svg stays on the threads
+class ImageLoader(QObject):
+    # task id, image type, QImage, original width, original height
+    loaded = Signal(int, int, object, int, int)
+    # same arguments, low quality image of a progressive task
+    previewed = Signal(int, int, object, int, int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.task_id = 0
+        self.sequence = itertools.count()
+        self.lock = threading.Lock()
+
+        # (-priority, -stage, sequence, task id, task), entries of changed jobs are stale
+        self.queue = []
+        # task id -> [task, priority, queued time]
+        self.jobs = {}
+        # task id -> task of the jobs in the pool
+        self.running = {}
+
+        # counters
+        self.done = 0
+        self.cancelled = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max(2, QThread.idealThreadCount() - 1))
+
+        self.decoder = None
+
+    # decode the still images in processes, 0 uses the thread pool
+    def set_processes(self, count):
+        if self.decoder is not None:
+            self.decoder.stop()
+            self.decoder = None
+
+        if count > 0:
+            self.decoder = ProcessDecoder(self, count)
+
+    # stop the decoder processes
+    def stop(self):
+        self.clear()
+        self.set_processes(0)
+
+    # queue a file, returns the task id used by the loaded signal
+    # ratio: device pixel ratio of the screen, tiles are decoded in device pixels
+    # progressive: emit previewed with a quick preview before loaded,
+    # not used with decoder processes
+    def load(
+        self,
+        file_path,
+        fix_width,
+        fix_height,
+        ratio=1.0,
+        progressive=False,
+        priority=LoadPriority.VISIBLE,
+    ):
+        with self.lock:
+            self.task_id += 1
+
+            task = LoadTask(
+                self,
+                self.task_id,
+                file_path,
+                fix_width,
+                fix_height,
+                ratio,
+                LoadTask.PREVIEW
+                if progressive and self.decoder is None
+                else LoadTask.FINAL,
+            )
+            self.jobs[task.task_id] = [task, priority, time.monotonic()]
+            self.push(task.task_id)
+
+        self.dispatch()
+
+        return task.task_id
+
+    # move a queued job to another priority class
+    def set_priority(self, task_id, priority):
+        with self.lock:
+            job = self.jobs.get(task_id)
+            if job is None or job[1] == priority:
+                return
+
+            job[1] = priority
+            if task_id not in self.running:
+                self.push(task_id)
+
+        self.dispatch()
+
+    # forget a job, the result of a running job is dropped
+    def cancel(self, task_id):
+        with self.lock:
+            if self.jobs.pop(task_id, None) is not None:
+                self.cancelled += 1
+
+    # drop all jobs
+    def clear(self):
+        with self.lock:
+            self.cancelled += len(self.jobs)
+            self.jobs = {}
+            self.queue = []
+
+    # queue entry of a job, the lock is held by the caller
+    def push(self, task_id):
+        task, priority, _ = self.jobs[task_id]
+        heapq.heappush(
+            self.queue, (-priority, -task.stage, next(self.sequence), task_id, task)
+        )
+
+    # hand the most urgent jobs to the pool while there are free threads
+    def dispatch(self):
+        tasks = []
+
+        with self.lock:
+            if self.decoder is None:
+                limit = self.pool.maxThreadCount()
+            else:
+                limit = self.decoder.count
+
+            while len(self.queue) > 0 and len(self.running) < limit:
+                priority, _, _, task_id, task = heapq.heappop(self.queue)
+                job = self.jobs.get(task_id)
+                # cancelled, moved to another priority or already running
+                if (
+                    job is None
+                    or job[0] is not task
+                    or job[1] != -priority
+                    or task_id in self.running
+                ):
+                    continue
+
+                self.running[task_id] = task
+                tasks.append(task)
+
+        for task in tasks:
+            if (
+                self.decoder is not None
+                and not ImageHelper.is_svg(task.file_path)
+                and self.decoder.submit(task)
+            ):
+                continue
+            self.pool.start(task)
+
+    # preview stage done on a worker thread, queue the smooth tile
+    # entry: (image, original width, original height) or None
+    def refine(self, task, entry):
+        with self.lock:
+            self.running.pop(task.task_id, None)
+            job = self.jobs.get(task.task_id)
+            alive = job is not None
+
+            if alive:
+                job[0] = LoadTask(
+                    self,
+                    task.task_id,
+                    task.file_path,
+                    task.fix_width,
+                    task.fix_height,
+                    task.ratio,
+                    LoadTask.FINAL,
+                )
+                self.push(task.task_id)
+
+        if alive and entry is not None:
+            image, orig_width, orig_height = entry
+            self.previewed.emit(
+                task.task_id, ImageType.Default, image, orig_width, orig_height
+            )
+
+        self.dispatch()
+
+    # job done on a worker thread, the result of a cancelled job is dropped
+    def finish(self, task, image_type, image, orig_width, orig_height):
+        with self.lock:
+            self.running.pop(task.task_id, None)
+            job = self.jobs.pop(task.task_id, None)
+            alive = job is not None
+
+            if alive:
+                latency = time.monotonic() - job[2]
+                self.done += 1
+                self.latency_total += latency
+                self.latency_max = max(self.latency_max, latency)
+
+        if alive:
+            self.loaded.emit(task.task_id, image_type, image, orig_width, orig_height)
+
+        self.dispatch()
+
+    # queue depth per priority class, running jobs and latency in ms
+    def stats(self):
+        with self.lock:
+            queued = {}
+            for task_id, job in self.jobs.items():
+                if task_id not in self.running:
+                    queued[job[1]] = queued.get(job[1], 0) + 1
+
+            return {
+                "queued": sum(queued.values()),
+                "visible": queued.get(LoadPriority.VISIBLE, 0),
+                "prefetch": queued.get(LoadPriority.PREFETCH, 0),
+                "idle": queued.get(LoadPriority.IDLE, 0),
+                "running": len(self.running),
+                "done": self.done,
+                "cancelled": self.cancelled,
+                "latency_avg": self.latency_total * 1000 / max(1, self.done),
+                "latency_max": self.latency_max * 1000,
+            }
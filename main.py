@@ -6,6 +6,7 @@ from PySide6.QtCore import QTranslator
 
 from icon import LogoIcon
 from main_window import MainWindow
+from metadata_index import MetadataIndex
 from setting import Setting
 from theme import Theme
 
@@ -33,4 +34,11 @@ if __name__ == "__main__":
     window.setWindowIcon(LogoIcon.get_icon())
     window.show()
 
-    sys.exit(app.exec())
+    result = app.exec()
+
+    window.shutdown()
+
+    # keep the probed sizes for the next start
+    MetadataIndex.instance().save()
+
+    sys.exit(result)
@@ -2,7 +2,7 @@
 
 import json
 import os
-from PySide6 import QtWidgets, QtGui, QtCore, QtSvg
+from PySide6 import QtWidgets, QtGui, QtCore
 from PySide6.QtGui import QCursor, QAction
 from PySide6.QtCore import Qt, QSize, QRect, Signal
 from PySide6.QtWidgets import (
@@ -35,86 +35,204 @@ from icon import LogoIcon, MenuIcon
 from style import LabelStyle, ButtonStyle, WidgetStyle, MenuStyle
 from utils import FileUtils
 from widget import WidgetManager
+from image_helper import ImageHelper, ImageType
+from image_loader import ImageLoader, LoadPriority
+from image_grid import ImageItem, GridGeometry, GridSelection
+from mipmap_cache import MipmapCache
+from metadata_index import MetadataIndex
+from folder_walker import FolderWalker
+from file_exporter import FileExporter
+from animation import AnimationClock
+from zoom_view import ZoomView
+from flipbook_window import FlipbookWindow
+
+class ViewSignals(QtCore.QObject):
+    # file path, QImage, original width, original height
+    svg_rendered = Signal(str, object, int, int)
+
+
+# rasterize a svg for the viewer on a pool thread
+class SvgTask(QtCore.QRunnable):
+    def __init__(self, signals, file_path, width):
+        super().__init__()
 
-# image type
-class ImageType:
-    GIF = 1
-    SVG = 2
-    WEBP = 3
-    Default = 0
-
-# drag type
-class DragAction:
-    ENTER = "1"
-    DROP = "2"
+        self.signals = signals
+        self.file_path = file_path
+        self.width = width
 
-class ImageHelper:
-    @staticmethod
-    def is_gif(file_path):
-        ext = os.path.splitext(file_path)[1]
-        if ext.lower() == ".gif" or ext.lower() == ".webp":
-            return True
-        return False
-    
-    @staticmethod
-    def is_svg(file_path):
-        ext = os.path.splitext(file_path)[1]
-        if ext.lower() == ".svg":
-            return True
-        return False
-    
-    @staticmethod
-    def image_from(file_path, width = None):
-        if ImageHelper.is_gif(file_path):
-            image_type = ImageType.GIF
-            image = QtGui.QMovie(file_path)
-            image.start()
-        elif ImageHelper.is_svg(file_path):
-            image_type = ImageType.SVG
-            render = QtSvg.QSvgRenderer(file_path)
-            rect = render.viewBox()
-            if width is None:
-                image_width = rect.width()
-                image_height = rect.height()
-            else:
-                image_width = width
-                image_height = int(width / (rect.width() / rect.height()))
-            image = QtGui.QPixmap(image_width, image_height)
-            image.fill(Qt.transparent)
-            painter = QtGui.QPainter(image)
-            render.render(painter)
-        else:
-            image_type = ImageType.Default
-            image = QtGui.QImage(file_path)
+    def run(self):
+        image, orig_width, orig_height = ImageHelper.svg_image(self.file_path, self.width)
+        self.signals.svg_rendered.emit(self.file_path, image, orig_width, orig_height)
 
-        return (image_type, image)
-    
-    @staticmethod
-    def image_type(image_tuple):
-        if image_tuple is None or len(image_tuple) < 1:
-            return None
-        
-        return image_tuple[0]
-    
-    @staticmethod
-    def image(image_tuple):
-        if image_tuple is None or len(image_tuple) < 2:
-            return None
-        
-        return image_tuple[1]
 
 # view image window
+# placeholder: pixmap of the tile, shown scaled up until the file is decoded
 class ViewWindow(BaseWindow):
-    def __init__(self, parent, file_path):
+    # files decoded ahead on each side of the shown one
+    PREFETCH_COUNT = 2
+
+    # items: the grid items to page through with the keys and the wheel
+    def __init__(self, parent, file_path, placeholder=None, items=None):
         super().__init__(parent)
 
         self.screen = QtGui.QGuiApplication.primaryScreen().geometry()
-        s_width = int(self.screen.width() * 0.618)
+        self.s_width = int(self.screen.width() * 0.618)
+
+        # a snapshot of the grid, removing tiles later does not change the order here
+        self.items = [item for item in (items or []) if len(item.file_path) > 0]
+        self.index = -1
+        for index, item in enumerate(self.items):
+            if item.file_path == file_path:
+                self.index = index
+                break
+        if self.index < 0:
+            self.items = []
+
+        self.zoom_view = None
+        self.widget_main = None
+        self.movie = None
+        # svg being rendered for the label
+        self.svg_path = None
+
+        # the pool is deleted first and waits for its running tasks,
+        # their signals are still there
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = ViewSignals(self)
+        self.signals.svg_rendered.connect(self.on_svg_rendered)
 
         self.base_layout = QtWidgets.QHBoxLayout()
-        self.widget_main = QtWidgets.QScrollArea()
-        self.widget_main.setWidgetResizable(True)
-        self.widget_main.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.set_body_layout(self.base_layout)
+        self.setStyleSheet("QDialog{border:1px solid; border-color:#4f5b62}")
+
+        self.show_file(file_path, placeholder)
+
+        self.init_max()
+
+    # show a file in the zoom view, or in the label for movies and svg
+    def show_file(self, file_path, placeholder=None):
+        if ImageHelper.is_gif(file_path) or ImageHelper.is_svg(file_path):
+            if self.zoom_view is not None:
+                self.zoom_view.hide()
+            orig_width, orig_height = self.init_label(
+                file_path, self.s_width, placeholder
+            )
+            self.setFocus()
+        else:
+            self.stop_movie()
+            self.svg_path = None
+            if self.widget_main is not None:
+                self.widget_main.hide()
+
+            if self.zoom_view is None:
+                # still images are shown by tiles, any size and zoom level
+                self.zoom_view = ZoomView()
+                self.base_layout.addWidget(self.zoom_view)
+            # the file is set first, showing the view does not restore the last one
+            self.zoom_view.set_file(file_path, placeholder)
+            self.zoom_view.show()
+            self.zoom_view.setFocus()
+            orig_width = self.zoom_view.image_size.width()
+            orig_height = self.zoom_view.image_size.height()
+
+        # the file size from the headers, svg and gifs are decoded scaled
+        info = MetadataIndex.instance().get(file_path)
+        if info[1] > 0 and info[2] > 0:
+            orig_width = info[1]
+            orig_height = info[2]
+
+        self.update_title(file_path, orig_width, orig_height)
+
+        self.prefetch()
+
+    def update_title(self, file_path, orig_width, orig_height):
+        title = file_path + "  " + str(orig_width) + "*" + str(orig_height)
+        title += ViewWindow.tr("title_pixel")
+        if len(self.items) > 1:
+            title += "  " + str(self.index + 1) + "/" + str(len(self.items))
+        self.set_title(title)
+
+    # decode the neighbours into the viewer cache while this file is looked at
+    def prefetch(self):
+        if self.zoom_view is None or self.index < 0:
+            return
+
+        file_paths = []
+        for distance in range(1, ViewWindow.PREFETCH_COUNT + 1):
+            for index in (self.index + distance, self.index - distance):
+                if 0 <= index < len(self.items):
+                    file_path = self.items[index].file_path
+                    if not ImageHelper.is_gif(file_path) and not ImageHelper.is_svg(
+                        file_path
+                    ):
+                        file_paths.append(file_path)
+
+        self.zoom_view.prefetch(file_paths)
+
+    # show the item at index, the grid tile is the placeholder
+    def go_to(self, index):
+        if len(self.items) == 0:
+            return
+
+        index = max(0, min(len(self.items) - 1, index))
+        if index == self.index:
+            return
+
+        self.index = index
+        item = self.items[index]
+        placeholder = item.image if isinstance(item.image, QtGui.QPixmap) else None
+        self.show_file(item.file_path, placeholder)
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        if key in (Qt.Key_Left, Qt.Key_Up, Qt.Key_PageUp, Qt.Key_Backspace):
+            self.go_to(self.index - 1)
+        elif key in (Qt.Key_Right, Qt.Key_Down, Qt.Key_PageDown, Qt.Key_Space):
+            self.go_to(self.index + 1)
+        elif key == Qt.Key_Home:
+            self.go_to(0)
+        elif key == Qt.Key_End:
+            self.go_to(len(self.items) - 1)
+        else:
+            super().keyPressEvent(event)
+
+    # the wheel pages through the files, ctrl+wheel zooms in the zoom view
+    def wheelEvent(self, event):
+        steps = event.angleDelta().y()
+        if steps < 0:
+            self.go_to(self.index + 1)
+        elif steps > 0:
+            self.go_to(self.index - 1)
+
+    def done(self, result):
+        self.stop_movie()
+        self.svg_path = None
+        self.pool.clear()
+        if self.zoom_view is not None:
+            self.zoom_view.stop()
+        super().done(result)
+
+    def stop_movie(self):
+        if self.movie is not None:
+            self.movie.stop()
+            self.movie = None
+
+    # movies and svg in a label, returns the original size
+    def init_label(self, file_path, s_width, placeholder=None):
+        self.stop_movie()
+        self.svg_path = None
+
+        if self.widget_main is None:
+            self.widget_main = QtWidgets.QScrollArea()
+            self.widget_main.setWidgetResizable(True)
+            self.widget_main.setAlignment(Qt.AlignmentFlag.AlignCenter)
+            # the arrow keys page through the files
+            self.widget_main.setFocusPolicy(Qt.NoFocus)
+            self.base_layout.addWidget(self.widget_main)
+        self.widget_main.show()
+
+        if ImageHelper.is_svg(file_path):
+            return self.init_svg(file_path, s_width, placeholder)
 
         image_tuple = ImageHelper.image_from(file_path, s_width)
         image_type = ImageHelper.image_type(image_tuple)
@@ -123,6 +241,7 @@ class ViewWindow(BaseWindow):
         if image_type == ImageType.GIF:
             orig_width = image.currentImage().width()
             orig_height = image.currentImage().height()
+            image.start()
         else:
             orig_width = image.width()
             orig_height = image.height()
@@ -137,36 +256,53 @@ class ViewWindow(BaseWindow):
 
         self.lbl_image = QtWidgets.QLabel()
         self.lbl_image.setFixedSize(width, height)
-        
+
         if image_type == ImageType.GIF:
+            self.movie = image
             self.lbl_image.setMovie(image)
-        elif image_type == ImageType.SVG:
-            self.lbl_image.setPixmap(image)
         else:
-            pixmap = QtGui.QPixmap.fromImage(
-                image.scaled(
-                    self.lbl_image.size(),
-                    aspectMode=Qt.KeepAspectRatio,
-                    mode=Qt.SmoothTransformation,
-                )
-            )
-            self.lbl_image.setPixmap(pixmap)
+            self.lbl_image.setPixmap(QtGui.QPixmap.fromImage(image))
 
+        # the label of the previous file is deleted
         self.widget_main.setWidget(self.lbl_image)
-        self.base_layout.addWidget(self.widget_main)
-        self.set_body_layout(self.base_layout)
 
-        self.setStyleSheet("QDialog{border:1px solid; border-color:#4f5b62}")
-        self.set_title(
-            file_path
-            + "  "
-            + str(orig_width)
-            + "*"
-            + str(orig_height)
-            + ViewWindow.tr("title_pixel")
-        )
+        return (orig_width, orig_height)
 
-        self.init_max()
+    # svg is rendered on the pool at the label width, the tile is shown scaled
+    # up until it is done, returns the original size or the tile size
+    def init_svg(self, file_path, s_width, placeholder):
+        orig_width = s_width
+        orig_height = s_width
+        if placeholder is not None:
+            size = placeholder.deviceIndependentSize()
+            orig_width = max(1, int(size.width()))
+            orig_height = max(1, int(size.height()))
+
+        self.lbl_image = QtWidgets.QLabel()
+        self.lbl_image.setFixedSize(s_width, max(1, int(s_width * orig_height / orig_width)))
+        self.lbl_image.setScaledContents(True)
+        if placeholder is not None:
+            self.lbl_image.setPixmap(placeholder)
+        self.widget_main.setWidget(self.lbl_image)
+
+        self.svg_path = file_path
+        self.pool.start(SvgTask(self.signals, file_path, s_width))
+
+        return (orig_width, orig_height)
+
+    def on_svg_rendered(self, file_path, image, orig_width, orig_height):
+        # another file is shown by now
+        if file_path != self.svg_path:
+            return
+
+        self.svg_path = None
+        if image.isNull():
+            print("ViewWindow: failed to render %s" % file_path)
+            return
+
+        self.lbl_image.setFixedSize(image.width(), image.height())
+        self.lbl_image.setPixmap(QtGui.QPixmap.fromImage(image))
+        self.update_title(file_path, orig_width, orig_height)
 
     # set max
     def init_max(self):
@@ -325,18 +461,221 @@ class SettingWindow(BaseWindow):
         self.done(0)
 
 
-# draggable QLabel
-class DragLabel(QtWidgets.QLabel):
+# draggable scroll area of the image grid
+# the grid widget only covers the viewport and paints the content at the scroll
+# offset, the scroll range is set from the content size, so the content is not
+# bound by the widget size limit of Qt(16777215 pixels)
+class DragScrollArea(QtWidgets.QAbstractScrollArea):
     drag_signal = QtCore.Signal(str)
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        self.file_path = ""
-        self.old_pixmap = None
-        self.clipboard = QtGui.QGuiApplication.clipboard()
+    # pixels of a scroll bar step, as in QScrollArea
+    SINGLE_STEP = 20
+
+    def __init__(self, prefetch_margin=800):
+        super().__init__()
 
-        self.setContextMenuPolicy(QtCore.Qt.ContextMenuPolicy.CustomContextMenu)
-        self.customContextMenuRequested.connect(self.on_show_menu)
+        self.content = None
+        self.content_size = QSize(0, 0)
+        self.horizontalScrollBar().setSingleStep(DragScrollArea.SINGLE_STEP)
+        self.verticalScrollBar().setSingleStep(DragScrollArea.SINGLE_STEP)
+
+        # pixels above and below the viewport that are decoded ahead of scrolling
+        self.prefetch_margin = prefetch_margin
+
+        # scroll speed in pixels per second, positive when scrolling down
+        self.velocity = 0.0
+        self.scroll_value = 0
+        self.scroll_clock = QtCore.QElapsedTimer()
+        self.scroll_clock.start()
+        self.verticalScrollBar().valueChanged.connect(self.on_scroll)
+
+    # the widget painting the content, it is kept at the size of the viewport
+    def setWidget(self, widget):
+        self.content = widget
+        widget.setParent(self.viewport())
+        widget.setGeometry(self.viewport().rect())
+        widget.show()
+
+    def widget(self):
+        return self.content
+
+    # size of the content in pixels, the scroll range follows it
+    def set_content_size(self, width, height):
+        self.content_size = QSize(width, height)
+        self.update_scroll_bars()
+
+    def update_scroll_bars(self):
+        viewport = self.viewport().size()
+        for scroll_bar, content, page in (
+            (self.horizontalScrollBar(), self.content_size.width(), viewport.width()),
+            (self.verticalScrollBar(), self.content_size.height(), viewport.height()),
+        ):
+            scroll_bar.setPageStep(page)
+            scroll_bar.setRange(0, max(0, content - page))
+
+    # top left corner of the viewport in content coordinates
+    def offset(self):
+        return QtCore.QPoint(
+            self.horizontalScrollBar().value(), self.verticalScrollBar().value()
+        )
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_scroll_bars()
+        if self.content is not None:
+            self.content.setGeometry(self.viewport().rect())
+
+    # the content paints itself at the new offset
+    def scrollContentsBy(self, dx, dy):
+        if self.content is not None:
+            self.content.update()
+
+    def set_prefetch_margin(self, margin):
+        self.prefetch_margin = max(0, margin)
+
+    # (top, bottom) of the viewport in content coordinates
+    def visible_range(self):
+        top = self.verticalScrollBar().value()
+        return (top, top + self.viewport().height())
+
+    # smooth the scroll speed, a pause starts over
+    def on_scroll(self, value):
+        elapsed = max(1, self.scroll_clock.restart())
+        speed = (value - self.scroll_value) * 1000 / elapsed
+        self.scroll_value = value
+
+        if elapsed > 300:
+            self.velocity = speed
+        else:
+            self.velocity = self.velocity * 0.5 + speed * 0.5
+
+    # 1 scrolling down, -1 scrolling up, 0 when the view is still
+    def scroll_direction(self):
+        if self.scroll_clock.elapsed() > 300 or abs(self.velocity) < 200:
+            return 0
+
+        return 1 if self.velocity > 0 else -1
+
+    # tiles in this range are decoded,
+    # most of the margin is put ahead of the scroll direction
+    def prefetch_range(self):
+        top, bottom = self.visible_range()
+        margin = self.prefetch_margin
+
+        direction = self.scroll_direction()
+        if direction > 0:
+            return (top - margin // 2, bottom + margin * 3 // 2)
+        if direction < 0:
+            return (top - margin * 3 // 2, bottom + margin // 2)
+
+        return (top - margin, bottom + margin)
+
+    # tiles outside this range release their images,
+    # it is wider than the prefetch range so scrolling back and forth does not reload
+    def release_range(self):
+        top, bottom = self.visible_range()
+        margin = self.prefetch_margin * 2 + self.viewport().height()
+        return (top - margin, bottom + margin)
+
+    # start dragging
+    def dragEnterEvent(self, event):
+        file_paths = DragScrollArea.local_paths(event.mimeData())
+        if len(file_paths) > 0:
+            event.accept()
+
+        print("enter: ", self, id(self), len(file_paths))
+
+    # end dragging
+    def dropEvent(self, event):
+        file_paths = DragScrollArea.local_paths(event.mimeData())
+        print("drop: ", self, id(self), len(file_paths))
+
+        if len(file_paths) > 0:
+            self.drag_emit(file_paths)
+
+    # send signal
+    def drag_emit(self, file_paths):
+        obj = {}
+        obj["id"] = id(self)
+        obj["file_paths"] = file_paths
+        self.drag_signal.emit(json.dumps(obj))
+
+    # supported images and folders in the url list of a drop or the clipboard
+    # text with one file url per line is used when there are no urls
+    @staticmethod
+    def local_paths(mime_data):
+        urls = mime_data.urls()
+        if len(urls) == 0 and mime_data.hasText():
+            urls = [QtCore.QUrl(line.strip()) for line in mime_data.text().splitlines()]
+
+        file_paths = []
+        for url in urls:
+            if not url.isLocalFile():
+                continue
+
+            file_path = url.toLocalFile()
+            if ImageHelper.is_supported(file_path) or os.path.isdir(file_path):
+                file_paths.append(file_path)
+
+        return file_paths
+
+
+# virtualized image grid
+# the tiles are painted by the grid itself, there is no widget per tile:
+# the hover border and the close button are drawn on the hovered tile and
+# found again by hit testing, one context menu serves every tile
+# tiles are selected by click, ctrl/shift click and a rubber band, the selected
+# tiles are removed, copied or exported together
+class ImageGrid(QtWidgets.QWidget):
+    # tile width, tile height, column count after a ctrl+wheel zoom
+    tile_size_changed = Signal(int, int, int)
+
+    # mime type of a tile dragged inside the grid, the data is its index
+    MIME_INDEX = "application/x-image-grid-index"
+    CLOSE_SIZE = 32
+    BORDER_WIDTH = 3
+    BORDER_COLOR = "#3d5afe"
+    CLOSE_COLOR = "red"
+    SELECTION_COLOR = QtGui.QColor(61, 90, 254, 64)
+
+    # pixels decoded ahead of the viewport at least
+    PREFETCH_MARGIN = 800
+
+    # ctrl+wheel zoom, tile widths as in the settings
+    ZOOM_STEP = 1.1
+    MIN_TILE_WIDTH = 100
+    MAX_TILE_WIDTH = 2000
+    # the tiles are decoded again once the wheel rests this long, in ms
+    ZOOM_SETTLE = 250
+
+    # close icon shared by the grids
+    close_pixmap = None
+
+    def __init__(self, scroll_area, fix_width=600, fix_height=370, column_count=1):
+        super().__init__()
+
+        self.scroll_area = scroll_area
+        self.items = []
+        self.grid = GridGeometry(fix_width, fix_height, column_count)
+
+        # item -> index of the visible items
+        self.visible = {}
+        # current frame of the visible animated items
+        self.frames = {}
+        self.hover_item = None
+        self.menu_item = None
+        self.press_item = None
+        self.press_pos = None
+        self.drag_item = None
+        self.selection = GridSelection()
+        # rubber band origin and rectangle, the selection it started from
+        self.band_origin = None
+        self.band_rect = QRect()
+        self.band_base = 0
+        self.relayout_pending = False
+        # first item index the pending relayout has to place again
+        self.relayout_first = None
+        self.clipboard = QtGui.QGuiApplication.clipboard()
 
         self.context_menu = QtWidgets.QMenu(self)
         self.copy_file = self.context_menu.addAction(MainWindow.tr("title_copy"))
@@ -350,144 +689,962 @@ class DragLabel(QtWidgets.QLabel):
         )
         self.open_file_folder.triggered.connect(self.on_open_folder)
 
-    # mouse enter
-    def enterEvent(self, event):
-        self.btn_close.setVisible(True)
-        self.setStyleSheet("QLabel{border:3px solid; border-color:#3d5afe;}")
+        self.context_menu.addSeparator()
+        self.select_all_action = self.context_menu.addAction(
+            MainWindow.tr("title_select_all")
+        )
+        self.select_all_action.triggered.connect(self.select_all)
+
+        self.remove_selected_action = self.context_menu.addAction(
+            MainWindow.tr("title_remove_selected")
+        )
+        self.remove_selected_action.triggered.connect(self.remove_selected)
+
+        self.export_action = self.context_menu.addAction(MainWindow.tr("title_export"))
+        self.export_action.triggered.connect(self.on_export)
+
+        # exports still copying
+        self.exporters = []
+
+        self.loading_items = {}
+        # items holding a decoded image that can be released again
+        self.loaded_items = set()
+        self.loader = ImageLoader(self)
+        self.loader.loaded.connect(self.on_image_loaded)
+        self.loader.previewed.connect(self.on_image_previewed)
+        # show quick previews before the smooth tiles
+        self.progressive = True
+
+        # no tile is decoded again while the zoom is changing
+        self.zooming = False
+        self.zoom_timer = QtCore.QTimer(self)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.timeout.connect(self.on_zoom_settled)
+
+        # advances the animated tiles that are visible
+        self.clock = AnimationClock(self)
+        self.clock.frame_changed.connect(self.on_frame_changed)
+
+        self.setMouseTracking(True)
+        self.setAcceptDrops(True)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.update_visible)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.update_visible()
+
+    # change tile size and column count
+    # the tiles show the nearest mipmap level, or their old pixmap drawn scaled,
+    # until the new size is decoded
+    def set_tile_size(self, fix_width, fix_height, column_count):
+        self.grid.set_tile_size(fix_width, fix_height, column_count)
+        # two rows of the tallest tiles are decoded ahead, at least the default
+        self.scroll_area.set_prefetch_margin(
+            max(
+                ImageGrid.PREFETCH_MARGIN,
+                2 * (max(self.grid.fix_width, self.grid.fix_height) + self.grid.spacing),
+            )
+        )
+
+        for item in list(self.loaded_items):
+            # movies are decoded on the GUI thread at tile size, load them again
+            # once the zoom rests
+            if item.image_type == ImageType.GIF:
+                if not self.zooming:
+                    self.release_item(item)
+            else:
+                self.apply_level(item)
+
+        # pasted images are scaled from their source
+        for item in self.items:
+            if item.source is not None:
+                self.set_item_image(item, item.source)
+
+        self.relayout()
+
+    # size, in device pixels, and the current tile size
+    def tile_key(self):
+        return (self.grid.fix_width, self.grid.fix_height, self.devicePixelRatioF())
+
+    # the image of the item was made for another tile size
+    def is_stale(self, item):
+        return item.image is not None and item.tile_key != self.tile_key()
+
+    # size of the tile of an item in device pixels
+    def device_size(self, item):
+        ratio = self.devicePixelRatioF()
+        width, height = ImageHelper.tile_size(
+            item.orig_width, item.orig_height, self.grid.fix_width, self.grid.fix_height
+        )
+        return QSize(max(1, int(width * ratio)), max(1, int(height * ratio)))
+
+    # show the mipmap level nearest to the tile size, a level of the exact size
+    # is final, returns False when the file has no levels
+    def apply_level(self, item):
+        if len(item.file_path) == 0 or item.image_type == ImageType.GIF:
+            return False
+
+        size = self.device_size(item)
+        level = MipmapCache.instance().get(item.file_path, size.width(), size.height())
+        if level is None:
+            return False
+
+        if item.image is None or item.image.size() != level.size():
+            item.image = QtGui.QPixmap.fromImage(level)
+            self.loaded_items.add(item)
+            self.update_item(item)
+        if level.size() == size:
+            item.tile_key = self.tile_key()
+
+        return True
+
+    def wheelEvent(self, event):
+        if not event.modifiers() & Qt.ControlModifier:
+            event.ignore()
+            return
+
+        steps = event.angleDelta().y() / 120
+        if steps == 0:
+            return
+
+        width = int(self.grid.fix_width * ImageGrid.ZOOM_STEP**steps)
+        width = max(ImageGrid.MIN_TILE_WIDTH, min(ImageGrid.MAX_TILE_WIDTH, width))
+        if width == self.grid.fix_width:
+            return
+
+        self.zoom_tiles(width, self.content_pos(event.position().toPoint()))
+
+    # change the tile width, the tile under the cursor stays where it is
+    # pos: cursor in content coordinates
+    def zoom_tiles(self, width, pos):
+        scroll_bar = self.scroll_area.verticalScrollBar()
+        view_y = pos.y() - scroll_bar.value()
+
+        index = self.grid.index_at(pos.x(), pos.y())
+        if index < 0:
+            index = self.grid.index_range(*self.scroll_area.visible_range())[0]
+        fraction = 0.0
+        if 0 <= index < len(self.items):
+            rect = self.grid.cell_rect(index, self.items[index])
+            fraction = (pos.y() - rect.top()) / max(1, rect.height())
+
+        height = width * 0.618
+        spacing = self.grid.spacing
+        column_count = max(
+            1,
+            (self.scroll_area.viewport().width() - self.grid.margin * 2 + spacing)
+            // (width + spacing),
+        )
+
+        self.zooming = True
+        self.zoom_timer.start(ImageGrid.ZOOM_SETTLE)
+        # the scroll range follows the new height before the anchor is restored
+        self.set_tile_size(width, height, column_count)
+
+        if 0 <= index < len(self.items):
+            rect = self.grid.cell_rect(index, self.items[index])
+            scroll_bar.setValue(int(rect.top() + fraction * rect.height() - view_y))
+
+        self.tile_size_changed.emit(
+            self.grid.fix_width, self.grid.fix_height, self.grid.column_count
+        )
+
+    # decode the tiles at the final zoom
+    def on_zoom_settled(self):
+        self.zooming = False
+
+        for item in list(self.loaded_items):
+            if item.image_type == ImageType.GIF and self.is_stale(item):
+                self.release_item(item)
+
+        self.update_visible()
+
+    # add an item
+    # image: QImage/QMovie/QPixmap, None adds a placeholder
+    def add_image(self, image, image_type, file_path):
+        item = ImageItem(file_path, image_type)
+
+        if image is not None:
+            self.set_item_image(item, image)
+
+        print("Add:", file_path, image_type, item.orig_width, item.orig_height)
+
+        self.items.append(item)
+        self.schedule_relayout(len(self.items) - 1)
+
+        return item
+
+    # add placeholders for [(file path, probe result), ...] with one relayout
+    def load_files(self, entries):
+        first = len(self.items)
+        self.items.extend(
+            self.placeholder(file_path, info) for file_path, info in entries
+        )
+        self.schedule_relayout(first)
+
+    # item of a file that is not decoded yet
+    def placeholder(self, file_path, info=None):
+        if ImageHelper.is_gif(file_path):
+            image_type = ImageType.GIF
+        elif ImageHelper.is_svg(file_path):
+            image_type = ImageType.SVG
+        else:
+            image_type = ImageType.Default
+
+        item = ImageItem(file_path, image_type)
+
+        # the size from the headers places the tile before any pixel is decoded
+        if info is None:
+            info = MetadataIndex.instance().get(file_path)
+        if info[1] > 0 and info[2] > 0:
+            item.set_orig_size(info[1], info[2])
+
+        return item
+
+    # decode the image of an item
+    def load_item(self, item, priority=LoadPriority.VISIBLE):
+        # QMovie can not leave the GUI thread
+        if item.image_type == ImageType.GIF:
+            movie, orig_width, orig_height = ImageHelper.movie_scaled(
+                item.file_path,
+                self.grid.fix_width,
+                self.grid.fix_height,
+                self.devicePixelRatioF(),
+            )
+            self.set_item_image(item, movie, orig_width, orig_height)
+            return
+
+        # a level of the exact size needs no decoding
+        if item.image is None and self.apply_level(item) and not self.is_stale(item):
+            return
+
+        # a stale tile is better than a preview
+        item.load_key = self.tile_key()
+        item.task_id = self.loader.load(
+            item.file_path,
+            self.grid.fix_width,
+            self.grid.fix_height,
+            self.devicePixelRatioF(),
+            self.progressive and item.image is None,
+            priority,
+        )
+        self.loading_items[item.task_id] = item
+
+    # callback when image decoded in the background
+    def on_image_loaded(self, task_id, image_type, image, orig_width, orig_height):
+        item = self.loading_items.pop(task_id, None)
+        if item is None:
+            return
+
+        item.task_id = None
+
+        print("Loaded:", item.file_path, image_type, orig_width, orig_height)
+
+        self.set_item_image(item, image, orig_width, orig_height, False)
+        if item.image is None:
+            return
+        item.tile_key = item.load_key
+
+        # the tile size changed while the file was decoding
+        if self.is_stale(item) and not self.zooming:
+            self.load_item(
+                item,
+                LoadPriority.VISIBLE if item in self.visible else LoadPriority.PREFETCH,
+            )
+
+    # callback when the preview of a progressive load is ready
+    def on_image_previewed(self, task_id, image_type, image, orig_width, orig_height):
+        item = self.loading_items.get(task_id)
+        if item is None or item.image is not None:
+            return
+
+        # the preview has the tile size at a lower pixel ratio, it is not scaled again
+        self.set_item_image(item, image, orig_width, orig_height, False)
+
+    # save the decoded image of an item and show it if the item is visible
+    # orig_width/orig_height: size of the file when the image is a scaled tile
+    # final: the image is made for the current tile size, not a preview
+    def set_item_image(
+        self, item, image, orig_width=None, orig_height=None, final=True
+    ):
+        if item.image_type == ImageType.GIF:
+            failed = image is None or not image.isValid()
+        else:
+            failed = image is None or image.isNull()
+
+        if failed:
+            item.failed = True
+            return
+
+        if orig_width is None:
+            if item.image_type == ImageType.GIF:
+                orig_width = image.currentImage().width()
+                orig_height = image.currentImage().height()
+            else:
+                orig_width = image.width()
+                orig_height = image.height()
+
+        portrait = item.is_portrait()
+        item.set_orig_size(orig_width, orig_height)
+
+        if item.image_type == ImageType.GIF:
+            item.image = image
+        else:
+            # pasted images keep the full image for other tile sizes
+            if len(item.file_path) == 0 and isinstance(image, QtGui.QImage):
+                item.source = image
+            item.image = self.pixmap_from(item, image)
+        if final:
+            item.tile_key = self.tile_key()
+
+        # pasted images can not be decoded again
+        if len(item.file_path) > 0:
+            self.loaded_items.add(item)
+
+        if item in self.visible:
+            self.frames.pop(item, None)
+            self.play_item(item)
+            self.update_item(item)
+
+        if item.is_portrait() != portrait:
+            self.schedule_relayout(self.index_of(item))
+
+    # show the new frame of an animated item
+    def on_frame_changed(self, item, pixmap):
+        if item in self.visible:
+            self.frames[item] = pixmap
+            self.update_item(item)
+
+    # repaint the cell of a visible item
+    def update_item(self, item):
+        index = self.visible.get(item)
+        if index is not None:
+            self.update_content(self.grid.cell_rect(index, item))
+
+    # animate a visible item
+    def play_item(self, item):
+        if item.image_type == ImageType.GIF and item.image is not None:
+            self.clock.add(item, item.image)
+
+    # drop the decoded image of an item far away from the viewport
+    def release_item(self, item):
+        self.clock.remove(item)
+        self.frames.pop(item, None)
+
+        item.image = None
+        self.loaded_items.discard(item)
+
+    # pixmap of a still image at the tile size
+    # decoded tiles already have the tile size in device pixels and the paint
+    # format, only pasted images are scaled and converted here
+    def pixmap_from(self, item, image):
+        if isinstance(image, QtGui.QPixmap):
+            return image
+
+        if len(item.file_path) == 0:
+            ratio = self.devicePixelRatioF()
+            width, height = ImageHelper.tile_size(
+                item.orig_width,
+                item.orig_height,
+                self.grid.fix_width,
+                self.grid.fix_height,
+            )
+            size = QSize(max(1, int(width * ratio)), max(1, int(height * ratio)))
+            if image.size() != size:
+                image = image.scaled(
+                    size,
+                    aspectMode=Qt.IgnoreAspectRatio,
+                    mode=Qt.SmoothTransformation,
+                )
+            image = ImageHelper.paint_image(image)
+            image.setDevicePixelRatio(ratio)
+
+        return QtGui.QPixmap.fromImage(image)
+
+    # position of an item, the visible items are looked up without a scan
+    # items that are not added yet are at the end
+    def index_of(self, item):
+        index = self.visible.get(item)
+        if index is not None and index < len(self.items) and self.items[index] is item:
+            return index
+
+        try:
+            return self.items.index(item)
+        except ValueError:
+            return len(self.items)
+
+    # remove an item, only the cells after it move
+    def remove_item(self, item):
+        index = self.index_of(item)
+        if index >= len(self.items):
+            return
+
+        if item.task_id is not None:
+            self.loader.cancel(item.task_id)
+        self.loading_items.pop(item.task_id, None)
+        self.loaded_items.discard(item)
+        self.clock.remove(item)
+        self.frames.pop(item, None)
+        del self.items[index]
+        self.selection.remove(index)
+        if self.hover_item is item:
+            self.hover_item = None
+        self.relayout(index)
+
+    # remove the selected items with one reflow from the first of them
+    def remove_selected(self):
+        if self.selection.is_empty():
+            return
+
+        indexes = list(self.selection.indexes())
+        indexes = [index for index in indexes if index < len(self.items)]
+        if len(indexes) == 0:
+            self.selection.clear()
+            return
+
+        for index in indexes:
+            item = self.items[index]
+            if item.task_id is not None:
+                self.loader.cancel(item.task_id)
+                self.loading_items.pop(item.task_id, None)
+            self.loaded_items.discard(item)
+            self.clock.remove(item)
+            self.frames.pop(item, None)
+            if self.hover_item is item:
+                self.hover_item = None
+
+        bits = self.selection.bits
+        first = indexes[0]
+        self.items[first:] = [
+            item
+            for index, item in enumerate(self.items[first:], first)
+            if not (bits >> index) & 1
+        ]
+        self.selection.clear()
+
+        print("Remove:", len(indexes))
+        self.relayout(first)
+
+    def select_all(self):
+        self.selection.select_all(len(self.items))
+        self.update()
+
+    def clear_selection(self):
+        if self.selection.is_empty():
+            return
+
+        self.selection.clear()
+        self.update()
+
+    # selected items in grid order
+    def selected_items(self):
+        return [
+            self.items[index]
+            for index in self.selection.indexes()
+            if index < len(self.items)
+        ]
+
+    # copy the selected files as urls, a single still image also as image data
+    def copy_selected(self):
+        self.copy_items(self.selected_items())
+
+    # the files as urls, a single item also as image data,
+    # nothing is decoded here, the image is the pasted source or the shown tile
+    def copy_items(self, items):
+        mime_data = QtCore.QMimeData()
+        urls = [
+            QtCore.QUrl.fromLocalFile(item.file_path)
+            for item in items
+            if len(item.file_path) > 0
+        ]
+        if len(urls) > 0:
+            mime_data.setUrls(urls)
+
+        if len(items) == 1 and items[0].image_type != ImageType.GIF:
+            item = items[0]
+            if item.source is not None and not item.source.isNull():
+                mime_data.setImageData(item.source)
+            elif isinstance(item.image, QtGui.QPixmap) and not item.image.isNull():
+                mime_data.setImageData(item.image.toImage())
+
+        if len(urls) == 0 and not mime_data.hasImage():
+            return
+
+        self.clipboard.setMimeData(mime_data)
+
+    # copy the selected files into a folder on a thread, pasted images are saved as png
+    def export_selected(self, folder):
+        entries = [(item.file_path, item.source) for item in self.selected_items()]
+        if len(entries) == 0:
+            return
+
+        exporter = FileExporter(folder, entries, self)
+        exporter.done.connect(lambda count: print("Export:", count, folder))
+        exporter.finished.connect(lambda: self.on_exporter_finished(exporter))
+        self.exporters.append(exporter)
+        exporter.start()
+
+    def on_exporter_finished(self, exporter):
+        if exporter in self.exporters:
+            self.exporters.remove(exporter)
+        exporter.deleteLater()
+
+    # stop the exports after the file being copied
+    def stop_exporters(self):
+        for exporter in self.exporters:
+            exporter.stop()
+            exporter.wait()
+        self.exporters = []
+
+    # swap the positions of two items
+    def swap_items(self, item, other):
+        index = self.index_of(item)
+        other_index = self.index_of(other)
+
+        self.items[index] = other
+        self.items[other_index] = item
+        self.selection.swap(index, other_index)
+
+        if item.is_portrait() != other.is_portrait():
+            self.relayout(min(index, other_index))
+        else:
+            self.update_visible()
+
+    # remove all items
+    def clear(self):
+        self.loader.clear()
+        self.clock.clear()
+        self.loading_items = {}
+        self.loaded_items = set()
+        self.frames = {}
+        self.hover_item = None
+        self.drag_item = None
+        self.selection.clear()
+        self.items.clear()
+        self.relayout()
+
+    # relayout once the current batch of changes is done
+    # first: index of the first item that was added, moved or changed
+    def schedule_relayout(self, first=0):
+        if self.relayout_first is None or first < self.relayout_first:
+            self.relayout_first = first
+        if self.relayout_pending:
+            return
+
+        self.relayout_pending = True
+        QtCore.QTimer.singleShot(0, self.on_relayout)
+
+    def on_relayout(self):
+        # done by a relayout in between
+        if self.relayout_pending:
+            self.relayout(self.relayout_first)
+
+    # recompute the cell positions from the item at first on and the size of the grid
+    # painting is held back until the cells are in their new places
+    def relayout(self, first=0):
+        if self.relayout_first is not None:
+            first = min(first, self.relayout_first)
+        self.relayout_pending = False
+        self.relayout_first = None
+
+        self.setUpdatesEnabled(False)
+        self.grid.update(self.items, first)
+        self.scroll_area.set_content_size(self.grid.width(), self.grid.height())
+        self.update_visible()
+        self.setUpdatesEnabled(True)
+
+    # track the visible items and repaint, animations of hidden items stop
+    def update_visible(self):
+        first, last = self.grid.index_range(*self.scroll_area.visible_range())
+
+        visible = {}
+        for index in range(first, last):
+            visible[self.items[index]] = index
+
+        for item in self.visible:
+            if item not in visible:
+                self.clock.remove(item)
+                self.frames.pop(item, None)
+        for item in visible:
+            if item not in self.visible:
+                self.play_item(item)
+        self.visible = visible
+
+        self.update()
+        self.update_loading()
+
+    # decode the items near the viewport, release the images far away from it
+    # visible tiles load first, then the prefetch range ahead of the scrolling,
+    # the rest of the release range is warmed up when the loader is idle
+    def update_loading(self):
+        visible_first, visible_last = self.grid.index_range(
+            *self.scroll_area.visible_range()
+        )
+        prefetch_first, prefetch_last = self.grid.index_range(
+            *self.scroll_area.prefetch_range()
+        )
+        first, last = self.grid.index_range(*self.scroll_area.release_range())
+
+        for index in range(first, last):
+            item = self.items[index]
+            if visible_first <= index < visible_last:
+                priority = LoadPriority.VISIBLE
+            elif prefetch_first <= index < prefetch_last:
+                priority = LoadPriority.PREFETCH
+            else:
+                priority = LoadPriority.IDLE
+
+            if item.task_id is not None:
+                self.loader.set_priority(item.task_id, priority)
+            elif not item.failed and (
+                item.image is None or (self.is_stale(item) and not self.zooming)
+            ):
+                # movies are decoded on the GUI thread, not ahead of time
+                if priority == LoadPriority.IDLE and item.image_type == ImageType.GIF:
+                    continue
+                self.load_item(item, priority)
+
+        keep = set(self.items[first:last])
+
+        # jobs that were scrolled away
+        for task_id, item in list(self.loading_items.items()):
+            if item not in keep:
+                self.loader.cancel(task_id)
+                del self.loading_items[task_id]
+                item.task_id = None
+
+        for item in [item for item in self.loaded_items if item not in keep]:
+            self.release_item(item)
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        # only stale tiles and mipmap levels are scaled
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+        # the cells are placed in content coordinates
+        offset = self.scroll_area.offset()
+        painter.translate(-offset)
+        clip = event.rect().translated(offset)
+
+        first, last = self.grid.index_range(clip.top(), clip.bottom() + 1)
+        for index in range(first, last):
+            item = self.items[index]
+            rect = self.grid.cell_rect(index, item)
+            if not rect.intersects(clip):
+                continue
+
+            pixmap = self.pixmap_of(item)
+            if pixmap is not None and not pixmap.isNull():
+                # a tile of the cell size is copied as it is
+                if pixmap.deviceIndependentSize().toSize() == rect.size():
+                    painter.drawPixmap(rect.topLeft(), pixmap)
+                else:
+                    painter.drawPixmap(rect, pixmap)
+
+            if self.selection.is_selected(index):
+                self.paint_selected(painter, rect)
+            if item is self.hover_item:
+                self.paint_hover(painter, rect)
+
+        if self.band_origin is not None and self.band_rect.intersects(clip):
+            painter.setPen(QtGui.QColor(ImageGrid.BORDER_COLOR))
+            painter.setBrush(ImageGrid.SELECTION_COLOR)
+            painter.drawRect(self.band_rect.adjusted(0, 0, -1, -1))
+
+    # tint and border of a selected tile
+    def paint_selected(self, painter, rect):
+        painter.fillRect(rect, ImageGrid.SELECTION_COLOR)
+
+        width = ImageGrid.BORDER_WIDTH
+        pen = QtGui.QPen(QtGui.QColor(ImageGrid.BORDER_COLOR), width)
+        pen.setJoinStyle(Qt.MiterJoin)
+        painter.setPen(pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(
+            QtCore.QRectF(rect).adjusted(width / 2, width / 2, -width / 2, -width / 2)
+        )
+
+    # border and close button of the hovered tile
+    def paint_hover(self, painter, rect):
+        width = ImageGrid.BORDER_WIDTH
+        pen = QtGui.QPen(QtGui.QColor(ImageGrid.BORDER_COLOR), width)
+        pen.setJoinStyle(Qt.MiterJoin)
+        painter.setPen(pen)
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(
+            QtCore.QRectF(rect).adjusted(width / 2, width / 2, -width / 2, -width / 2)
+        )
+
+        close_rect = self.close_rect(rect)
+        painter.fillRect(close_rect, QtGui.QColor(ImageGrid.CLOSE_COLOR))
+        if ImageGrid.close_pixmap is None:
+            ImageGrid.close_pixmap = qta.icon("mdi.close", color="#fafafa").pixmap(
+                QSize(24, 24), self.devicePixelRatioF()
+            )
+        painter.drawPixmap(close_rect.topLeft() + QtCore.QPoint(4, 4), ImageGrid.close_pixmap)
+
+    # close button in the top right corner of a cell
+    def close_rect(self, rect):
+        return QRect(
+            rect.right() - ImageGrid.CLOSE_SIZE - 2,
+            rect.top() + 3,
+            ImageGrid.CLOSE_SIZE,
+            ImageGrid.CLOSE_SIZE,
+        )
+
+    # pixmap shown for an item, None while it is decoding
+    def pixmap_of(self, item):
+        if item.image is None:
+            return None
+
+        if item.image_type == ImageType.GIF:
+            pixmap = self.frames.get(item)
+            if pixmap is None:
+                pixmap = item.image.currentPixmap()
+            return pixmap
+
+        return item.image
+
+    # point of the widget in content coordinates
+    def content_pos(self, pos):
+        return pos + self.scroll_area.offset()
+
+    # repaint a rectangle given in content coordinates
+    def update_content(self, rect):
+        self.update(rect.translated(-self.scroll_area.offset()))
+
+    # (item, cell rect) at a point of the content, (None, None) between the cells
+    def item_at(self, pos):
+        index = self.grid.index_at(pos.x(), pos.y())
+        if index < 0:
+            return (None, None)
+
+        item = self.items[index]
+        rect = self.grid.cell_rect(index, item)
+        if not rect.contains(pos):
+            return (None, None)
+
+        return (item, rect)
+
+    def set_hover_item(self, item):
+        if item is self.hover_item:
+            return
+
+        for old in (self.hover_item, item):
+            if old is not None:
+                self.update_item(old)
+        self.hover_item = item
+
+    def mouseMoveEvent(self, event):
+        pos = self.content_pos(event.position().toPoint())
+
+        if self.band_origin is not None:
+            self.update_band(pos)
+            return
+
+        item, rect = self.item_at(pos)
+        self.set_hover_item(item)
+
+        if (
+            self.press_item is not None
+            and event.buttons() & Qt.LeftButton
+            and (pos - self.press_pos).manhattanLength()
+            >= QApplication.startDragDistance()
+        ):
+            self.start_drag(self.press_item)
 
-    # mouse leave
     def leaveEvent(self, event):
-        self.btn_close.setVisible(False)
-        self.setStyleSheet("QLabel{border:0px solid;}")
+        self.set_hover_item(None)
 
-    # mouse press
+    # a click selects the tile, ctrl toggles it, shift selects the range from the
+    # last clicked tile, a press between the tiles starts a rubber band
     def mousePressEvent(self, event):
+        self.press_item = None
         # allow the context menu to pop up
-        if event.button() == Qt.RightButton:
+        if event.button() != Qt.LeftButton:
             return
-        
-        if self.is_gif():
+
+        pos = self.content_pos(event.position().toPoint())
+        modifiers = event.modifiers()
+        item, rect = self.item_at(pos)
+        if item is None:
+            self.band_origin = pos
+            self.band_rect = QRect(pos, pos)
+            if modifiers & Qt.ControlModifier:
+                self.band_base = self.selection.bits
+            else:
+                self.band_base = 0
+                self.clear_selection()
+            return
+
+        if self.close_rect(rect).contains(pos):
+            self.remove_item(item)
+            return
+
+        index = self.index_of(item)
+        if modifiers & Qt.ShiftModifier:
+            self.selection.select_range(index, bool(modifiers & Qt.ControlModifier))
+        elif modifiers & Qt.ControlModifier:
+            self.selection.toggle(index)
+        else:
+            # a selected tile keeps the selection until the button is released
+            if not self.selection.is_selected(index):
+                self.selection.select(index)
+            self.press_item = item
+            self.press_pos = pos
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        if self.band_origin is not None:
+            self.band_origin = None
+            self.update()
+            return
+
+        # a click without dragging selects only the clicked tile
+        if self.press_item is not None and self.press_item in self.visible:
+            self.selection.select(self.visible[self.press_item])
+            self.update()
+        self.press_item = None
+
+    # select the tiles the rubber band touches
+    def update_band(self, pos):
+        old_rect = self.band_rect
+        old_bits = self.selection.bits
+        self.band_rect = QRect(self.band_origin, pos).normalized()
+
+        bits = 0
+        first, last = self.grid.index_range(
+            self.band_rect.top(), self.band_rect.bottom() + 1
+        )
+        for index in range(first, last):
+            if self.grid.cell_rect(index, self.items[index]).intersects(self.band_rect):
+                bits |= 1 << index
+
+        self.selection.bits = self.band_base | bits
+        if self.selection.bits != old_bits:
+            self.update()
+        else:
+            self.update_content(old_rect.united(self.band_rect).adjusted(-1, -1, 1, 1))
+
+    # tooltip of the close button
+    def event(self, event):
+        if event.type() == QtCore.QEvent.ToolTip:
+            pos = self.content_pos(event.pos())
+            item, rect = self.item_at(pos)
+            if item is not None and self.close_rect(rect).contains(pos):
+                QtWidgets.QToolTip.showText(
+                    event.globalPos(), MainWindow.tr("title_remove_image"), self
+                )
+            else:
+                QtWidgets.QToolTip.hideText()
+                event.ignore()
+            return True
+
+        return super().event(event)
+
+    # drag a tile, dropping it on another tile swaps the two
+    # still images carry their pixmap for other applications
+    def start_drag(self, item):
+        self.press_item = None
+        if item.image is None or item.image_type == ImageType.GIF:
             return
 
-        drag = QtGui.QDrag(self)
         mime_data = QtCore.QMimeData()
-        mime_data.setImageData(self.pixmap())
+        mime_data.setData(ImageGrid.MIME_INDEX, str(self.items.index(item)).encode())
+        mime_data.setImageData(item.image)
+
+        self.drag_item = item
+        drag = QtGui.QDrag(self)
         drag.setMimeData(mime_data)
         drag.exec()
+        self.drag_item = None
 
-    # start dragging
     def dragEnterEvent(self, event):
-        if self.is_gif():
-            return
-        
-        image = event.mimeData().imageData()
-        if image is None:
+        # files go to the scroll area
+        if not event.mimeData().hasFormat(ImageGrid.MIME_INDEX) or self.drag_item is None:
+            event.ignore()
             return
 
         event.accept()
-        print("enter: ", self, id(self), image)
 
-        self.drag_emit(DragAction.ENTER)
+    def dragMoveEvent(self, event):
+        item, rect = self.item_at(self.content_pos(event.position().toPoint()))
+        self.set_hover_item(item)
+        if item is None or item.image_type == ImageType.GIF:
+            event.ignore()
+            return
+
+        event.accept()
 
-    # end dragging
     def dropEvent(self, event):
-        if self.is_gif():
+        item, rect = self.item_at(self.content_pos(event.position().toPoint()))
+        orig_item = self.drag_item
+        if item is None or orig_item is None or orig_item is item:
             return
-        
-        image = event.mimeData().imageData()
-        if image is None:
+        if orig_item not in self.items:
             return
 
-        self.old_pixmap = self.pixmap()
-        self.setPixmap(event.mimeData().imageData())
+        self.swap_items(orig_item, item)
 
-        self.drag_emit(DragAction.DROP)
+    # a tile outside the selection is selected alone before the menu shows
+    def contextMenuEvent(self, event):
+        item, rect = self.item_at(self.content_pos(event.pos()))
+        if item is None and self.selection.is_empty():
+            return
 
-    # send signal
-    def drag_emit(self, action):
-        obj = {}
-        obj["id"] = id(self)
-        obj["action"] = action
-        self.drag_signal.emit(json.dumps(obj))
+        if item is not None:
+            index = self.index_of(item)
+            if not self.selection.is_selected(index):
+                self.selection.select(index)
+                self.update()
 
-    # save close buttion
-    def set_button(self, btn):
-        self.btn_close = btn
+        self.menu_item = item
+        for action in (self.view_file, self.open_file_folder):
+            action.setEnabled(item is not None)
+        self.context_menu.popup(event.globalPos())
 
-    # save file path
-    def set_file_path(self, file_path):
-        self.file_path = file_path
+    # callback of the export action
+    def on_export(self):
+        if self.selection.is_empty():
+            return
 
-    # check gif
-    def is_gif(self):
-        if ImageHelper.is_gif(self.file_path):
-            return True
-        
-        return False
+        folder = QtWidgets.QFileDialog.getExistingDirectory(
+            self, MainWindow.tr("title_choose_folder")
+        )
+        if len(folder) == 0:
+            return
 
-    # show context menu
-    def on_show_menu(self, pos):
-        print("show:", self.sender())
-        pos = self.mapToGlobal(pos)
-        self.context_menu.move(pos)
-        self.context_menu.show()
+        self.export_selected(folder)
 
-    # callback when file copied
+    # callback when file copied, several selected tiles are copied as files
     def on_copy_file(self):
-        if self.is_gif():
+        if self.selection.count() > 1 or self.menu_item is None:
+            self.copy_selected()
             return
 
-        mime_data = QtCore.QMimeData()
-        mime_data.setImageData(QtGui.QImage(self.file_path))
-        self.clipboard.setMimeData(mime_data)
+        self.copy_items([self.menu_item])
 
     # callback when file viewed
     def on_view_file(self):
-        dlg = ViewWindow(self, self.file_path)
+        item = self.menu_item
+        if item is None or len(item.file_path) == 0:
+            return
+
+        # the tile is shown at once, the viewer decodes the file in the background
+        placeholder = item.image if isinstance(item.image, QtGui.QPixmap) else None
+
+        dlg = ViewWindow(self, item.file_path, placeholder, self.items)
         dlg.exec()
+        # the decoded images and the items snapshot go with the window
+        dlg.deleteLater()
 
     # callback when folder opened
     def on_open_folder(self):
-        print(self.file_path)
-        if len(self.file_path) == 0:
+        item = self.menu_item
+        if item is None or len(item.file_path) == 0:
             return
 
-        os.startfile(os.path.split(self.file_path)[0])
-
-
-# draggable QScrollArea
-class DragScrollArea(QtWidgets.QScrollArea):
-    drag_signal = QtCore.Signal(str)
-
-    def __init__(self):
-        super().__init__()
-
-    # start dragging
-    def dragEnterEvent(self, event):
-        mime_data = event.mimeData()
-        file_name = mime_data.text()
-        postfix = os.path.splitext(file_name)[1]
-        if postfix.lower() in [".jpg", ".jpeg", ".png", ".bmp", ".gif", ".svg", ".webp"]:
-            event.accept()
-
-        print("enter: ", self, id(self), file_name, postfix)
-
-    # end dragging
-    def dropEvent(self, event):
-        mime_data = event.mimeData()
-        text = mime_data.text()
-
-        file_path = text.split("file:///")[1]
-        print("drop: ", self, id(self), file_path)
-
-        self.drag_emit(file_path)
-
-    # send signal
-    def drag_emit(self, file_path):
-        obj = {}
-        obj["id"] = id(self)
-        obj["file_path"] = file_path
-        self.drag_signal.emit(json.dumps(obj))
+        print(item.file_path)
+        os.startfile(os.path.split(item.file_path)[0])
 
 
 # main window
@@ -655,6 +1812,26 @@ class MainWindow(QMainWindow):
         self.open_file_menu = btn_open_file
         toolLayout.addWidget(btn_open_file)
 
+        btn_open_folder = QPushButton()
+        btn_open_folder.setFixedSize(QSize(24, 24))
+        btn_open_folder.setFlat(True)
+        btn_open_folder.setIcon(MenuIcon.get_open_folder())
+        btn_open_folder.setIconSize(QSize(24, 24))
+        btn_open_folder.setToolTip(MainWindow.tr("menu_open_folder"))
+        btn_open_folder.clicked.connect(self.on_open_folder)
+        self.open_folder_menu = btn_open_folder
+        toolLayout.addWidget(btn_open_folder)
+
+        btn_flipbook = QPushButton()
+        btn_flipbook.setFixedSize(QSize(24, 24))
+        btn_flipbook.setFlat(True)
+        btn_flipbook.setIcon(MenuIcon.get_flipbook())
+        btn_flipbook.setIconSize(QSize(24, 24))
+        btn_flipbook.setToolTip(MainWindow.tr("menu_flipbook"))
+        btn_flipbook.clicked.connect(self.on_flipbook)
+        self.flipbook_menu = btn_flipbook
+        toolLayout.addWidget(btn_flipbook)
+
         btn_remove_file = QPushButton()
         btn_remove_file.setFixedSize(QSize(24, 24))
         btn_remove_file.setFlat(True)
@@ -684,15 +1861,12 @@ class MainWindow(QMainWindow):
         self.horizontalLayoutTop.addWidget(self.toolWidget)
 
         self.widget_main = DragScrollArea()
-        self.widget_main.setWidgetResizable(True)
         self.widget_main.setMouseTracking(True)
         self.widget_main.setAcceptDrops(True)
         self.widget_main.drag_signal.connect(self.on_drag_image)
 
-        self.widget_base = QtWidgets.QWidget()
-
-        self.body_layout = QtWidgets.QGridLayout(self.widget_base)
-        self.body_layout.setSpacing(8)
+        self.widget_base = ImageGrid(self.widget_main)
+        self.widget_base.tile_size_changed.connect(self.on_tile_size_changed)
 
         self.widget_main.setWidget(self.widget_base)
         self.horizontalLayoutTop.addWidget(self.widget_main)
@@ -710,6 +1884,12 @@ class MainWindow(QMainWindow):
         self.key_open = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+O"), self)
         self.key_open.activated.connect(self.on_open_file)
 
+        self.key_open_folder = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+Shift+O"), self)
+        self.key_open_folder.activated.connect(self.on_open_folder)
+
+        self.key_flipbook = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+P"), self)
+        self.key_flipbook.activated.connect(self.on_flipbook)
+
         self.key_clear = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+E"), self)
         self.key_clear.activated.connect(self.clear_layout)
 
@@ -719,22 +1899,36 @@ class MainWindow(QMainWindow):
         self.key_paste = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+V"), self)
         self.key_paste.activated.connect(self.on_paste_image)
 
+        self.key_copy = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+C"), self)
+        self.key_copy.activated.connect(self.widget_base.copy_selected)
+
+        self.key_select_all = QtGui.QShortcut(QtGui.QKeySequence("Ctrl+A"), self)
+        self.key_select_all.activated.connect(self.widget_base.select_all)
+
+        self.key_remove = QtGui.QShortcut(QtGui.QKeySequence("Delete"), self)
+        self.key_remove.activated.connect(self.widget_base.remove_selected)
+
+        self.key_unselect = QtGui.QShortcut(QtGui.QKeySequence("Escape"), self)
+        self.key_unselect.activated.connect(self.widget_base.clear_selection)
+
     # initialize common data
     def init_data(self):
         self.screen = QtGui.QGuiApplication.primaryScreen().geometry()
 
         self.fix_width = 600
         self.fix_height = self.fix_width * 0.618
-        self.images = []
-        self.row = 1
-        self.column = 0
         self.column_count = int(self.screen.width() / self.fix_width)
 
-        self.labels = {}
-        self.btn_labels = {}
-        self.drag_labels = []
-        self.image_labels = {}
+        self.widget_base.set_tile_size(
+            self.fix_width, self.fix_height, self.column_count
+        )
+        self.widget_base.loader.set_processes(self.setting.get_decode_processes())
+
+        # grid order of the ImageItems
+        self.images = self.widget_base.items
         self.last_path = os.getcwd()
+        # running folder imports
+        self.walkers = []
 
     # show max window
     def show_max(self):
@@ -746,156 +1940,146 @@ class MainWindow(QMainWindow):
     # image: QImage/QMovie
     # file_path: image path
     def add_image(self, image, image_type, file_path):
-        #print(image.width(), image.height())
-        orig_width = 0
-        orig_height = 0
-
         print("add:", image, image_type, file_path)
 
-        if image_type == ImageType.GIF:
-            orig_width = image.currentImage().width()
-            orig_height = image.currentImage().height()
-        else:
-            orig_width = image.width()
-            orig_height = image.height()
-
-        width = self.fix_width
-        height = self.fix_height
+        return self.widget_base.add_image(image, image_type, file_path)
 
-        print("Add:", file_path, image_type, orig_width, orig_height)
+    # callback when image dragged
+    def on_drag_image(self, msg):
+        obj = json.loads(msg)
+        id = obj["id"]
+        file_paths = obj["file_paths"]
+        print("on_drag_image:", id, len(file_paths))
 
-        if orig_height > orig_width:
-            width = self.fix_height
-            height = self.fix_width
+        self.import_paths(file_paths)
 
-        label = DragLabel(self)
-        label.setMouseTracking(True)
-        label.setFixedSize(width, height)
-        label.setAcceptDrops(True)
-        
-        if image_type == ImageType.GIF:
-            label.setMovie(image)
-        elif image_type == ImageType.SVG:
-            label.setPixmap(image)
-        else:
-            pixmap = QtGui.QPixmap.fromImage(
-                image.scaled(
-                    label.size(),
-                    aspectMode=Qt.IgnoreAspectRatio,
-                    mode=Qt.SmoothTransformation,
-                )
-            )
-            label.setPixmap(pixmap)
-        label.setScaledContents(True)
-        label.setMouseTracking(True)
-        label.drag_signal.connect(self.on_change_image)
-
-        btn = QtWidgets.QPushButton(label)
-        btn.setIcon(qta.icon("mdi.close", color="#fafafa"))
-        btn.setStyleSheet(
-            "QPushButton{background-color:red; border: 1px solid red; border-radius: 0px;}"
+    # callback of open file button
+    def on_open_file(self):
+        result = QtWidgets.QFileDialog.getOpenFileNames(
+            self, MainWindow.tr("title_choose_image"), self.last_path, "*.*"
         )
-        btn.setIconSize(QSize(24, 24))
-        btn.setFixedSize(QSize(32, 32))
-        btn.setToolTip(MainWindow.tr("title_remove_image"))
-        btn.move(label.width() - 35, 3)
-        btn.setVisible(False)
-        btn.clicked.connect(self.on_close_image)
-
-        label.set_button(btn)
-        label.set_file_path(file_path)
-
-        self.labels[id(label)] = label
-        self.btn_labels[id(btn)] = label
-        self.image_labels[id(label)] = file_path
-
-        self.body_layout.addWidget(label, self.row, self.column)
+        print(result)
+        file_paths = result[0]
+        if len(file_paths) == 0:
+            return
 
-        self.column += 1
+        self.last_path = os.path.split(file_paths[0])[0]
+        # print("end:", self.last_path)
 
-        if self.column % self.column_count == 0:
-            self.row += 1
-            self.column = 0
+        print("Open:", len(file_paths))
+        self.import_paths(file_paths)
 
-        self.images.append(label)
+    # callback of open folder button
+    def on_open_folder(self):
+        folder = QtWidgets.QFileDialog.getExistingDirectory(
+            self, MainWindow.tr("title_choose_folder"), self.last_path
+        )
+        if len(folder) == 0:
+            return
 
-    # callback when image changed
-    def on_change_image(self, msg):
-        obj = json.loads(msg)
-        img_id = obj["id"]
-        action = obj["action"]
+        self.last_path = folder
+        self.import_paths([folder])
 
-        print("on_change_image:", msg)
+    # play the grid in its order, or the images of a folder when the grid is empty
+    def on_flipbook(self):
+        file_paths = [
+            item.file_path
+            for item in self.widget_base.items
+            if len(item.file_path) > 0 and not ImageHelper.is_svg(item.file_path)
+        ]
 
-        if action == DragAction.ENTER:
-            label = self.labels[img_id]
-            self.drag_labels.append(label)
-        if action == DragAction.DROP:
-            label = self.labels[img_id]
-            if len(self.drag_labels) < 2:
+        if len(file_paths) == 0:
+            folder = QtWidgets.QFileDialog.getExistingDirectory(
+                self, MainWindow.tr("title_choose_folder"), self.last_path
+            )
+            if len(folder) == 0:
                 return
 
-            self.drag_labels.remove(label)
-            orig_label = self.drag_labels[0]
-            orig_label.setPixmap(label.old_pixmap)
+            self.last_path = folder
+            self.walk_flipbook(folder)
+            return
 
-            file_path = label.file_path
-            orig_path = orig_label.file_path
+        self.open_flipbook(file_paths)
 
-            orig_label.set_file_path(file_path)
-            label.set_file_path(orig_path)
+    # walk the folder on a thread, the flipbook opens once all the files are found
+    def walk_flipbook(self, folder):
+        print("Flipbook walk:", folder)
 
-            self.drag_labels = []
+        file_paths = []
+        walker = FolderWalker([folder], self)
+        walker.found.connect(
+            lambda entries: self.on_flipbook_found(walker, entries, file_paths)
+        )
+        walker.done.connect(lambda count: self.open_flipbook(file_paths))
+        walker.finished.connect(lambda: self.on_walker_finished(walker))
+        self.walkers.append(walker)
+        walker.start()
+
+    def on_flipbook_found(self, walker, entries, file_paths):
+        # chunks sent before the walk was stopped
+        if walker not in self.walkers:
+            return
 
-    # callback when image dragged
-    def on_drag_image(self, msg):
-        obj = json.loads(msg)
-        id = obj["id"]
-        file_path = obj["file_path"]
-        print("on_drag_image:", msg)
-            
-        image_tuple = ImageHelper.image_from(file_path, self.fix_width)
-        image_type = ImageHelper.image_type(image_tuple)
-        image = ImageHelper.image(image_tuple)
-                
-        self.add_image(image, image_type, file_path)
+        file_paths.extend(
+            file_path
+            for file_path, _ in entries
+            if not ImageHelper.is_svg(file_path)
+        )
+        walker.consumed()
 
-    # callback when image closed
-    def on_close_image(self):
-        btn = self.sender()
-        label = self.btn_labels.get(id(btn))
+    def open_flipbook(self, file_paths):
+        if len(file_paths) == 0:
+            return
 
-        btn.setParent(None)
-        label.setParent(None)
+        print("Flipbook:", len(file_paths))
+        dlg = FlipbookWindow(self, file_paths)
+        dlg.exec()
+        dlg.deleteLater()
+
+    # add files and the images below folders, the headers are probed in the background
+    # the files are inserted in chunks, each chunk is one relayout
+    def import_paths(self, file_paths):
+        print("Import:", len(file_paths))
+
+        walker = FolderWalker(file_paths, self)
+        walker.found.connect(self.on_folder_found)
+        walker.done.connect(self.on_folder_done)
+        walker.finished.connect(lambda: self.on_walker_finished(walker))
+        self.walkers.append(walker)
+        walker.start()
+
+    # a chunk of files from a folder walker, one chunk per event
+    def on_folder_found(self, entries):
+        walker = self.sender()
+        # chunks sent before the import was stopped
+        if walker not in self.walkers:
+            return
 
-        self.body_layout.removeWidget(label)
-        self.body_layout.update()
+        self.widget_base.load_files(entries)
+        walker.consumed()
 
-        label.deleteLater()
-        btn.deleteLater()
+    def on_folder_done(self, count):
+        print("Import done:", count)
+        print("ImageLoader:", self.widget_base.loader.stats())
 
-        self.refresh_layout()
+    def on_walker_finished(self, walker):
+        if walker in self.walkers:
+            self.walkers.remove(walker)
+        walker.deleteLater()
 
-    # callback of open file button
-    def on_open_file(self):
-        result = QtWidgets.QFileDialog.getOpenFileNames(
-            self, MainWindow.tr("title_choose_image"), self.last_path, "*.*"
-        )
-        print(result)
-        file_paths = result[0]
-        if len(file_paths) == 0:
-            return
-
-        self.last_path = os.path.split(file_paths[0])[0]
-        # print("end:", self.last_path)
+    # stop the folder imports
+    def stop_walkers(self):
+        for walker in self.walkers:
+            walker.stop()
+            walker.wait()
+        self.walkers = []
 
-        for file_path in file_paths:
-            image_tuple = ImageHelper.image_from(file_path, self.fix_width)
-            image_type = ImageHelper.image_type(image_tuple)
-            image = ImageHelper.image(image_tuple)
-                
-            print("Open:", file_path, image_type, image)
-            self.add_image(image, image_type, file_path)
+    # stop the background work before the application quits
+    def shutdown(self):
+        self.stop_walkers()
+        print("ImageLoader:", self.widget_base.loader.stats())
+        self.widget_base.loader.stop()
+        self.widget_base.stop_exporters()
 
     # callback when image removed
     def on_remove_file(self):
@@ -916,75 +2100,48 @@ class MainWindow(QMainWindow):
 
         print("setting:", self.fix_width, self.fix_height, self.column_count)
 
+    # the grid was zoomed with ctrl+wheel
+    def on_tile_size_changed(self, fix_width, fix_height, column_count):
+        self.fix_width = fix_width
+        self.fix_height = fix_height
+        self.column_count = column_count
+
     # callback when image pasted
     def on_paste_image(self):
         mime_data = self.clipboard.mimeData()
         if mime_data:
-            if mime_data.hasImage():
+            # files copied in a file manager
+            file_paths = DragScrollArea.local_paths(mime_data)
+            if len(file_paths) > 0:
+                self.import_paths(file_paths)
+            elif mime_data.hasImage():
                 image = QtGui.QImage(mime_data.imageData())
                 self.add_image(image, ImageType.Default, None)
 
     # clear current layout
     def clear_layout(self):
-        print("clear: ", self.body_layout.rowCount(), self.body_layout.columnCount())
-        for row in range(1, self.body_layout.rowCount() + 1):
-            for column in range(self.body_layout.columnCount()):
-                item = self.body_layout.itemAtPosition(row, column)
-                print("clear: ", item, id(item))
-                if item is None:
-                    continue
-
-                label = item.widget()
-
-                self.body_layout.removeItem(item)
-
-                if label:
-                    btn = label.btn_close
-                    btn.deleteLater()
-                    label.deleteLater()
-
-        self.body_layout.update()
+        print("clear: ", len(self.images))
 
-        self.row = 1
-        self.column = 0
+        self.stop_walkers()
+        self.widget_base.clear()
 
     # refresh current layout
     def refresh_layout(self):
-        print("refresh: ", self.body_layout.rowCount(), self.body_layout.columnCount())
+        print("refresh: ", len(self.images))
 
-        widgets = []
-
-        for row in range(1, self.body_layout.rowCount() + 1):
-            for column in range(self.body_layout.columnCount()):
-                item = self.body_layout.itemAtPosition(row, column)
-
-                if item is None:
-                    continue
-
-                widgets.append(item.widget())
-                self.body_layout.removeItem(item)
-
-        self.row = 1
-        self.column = 0
-
-        for widget in widgets:
-            width = self.fix_width
-            height = self.fix_height
-
-            if widget.height() > widget.width():
-                width = self.fix_height
-                height = self.fix_width
-
-            widget.setFixedSize(width, height)
-            widget.btn_close.move(widget.width() - 35, 3)
-
-            self.body_layout.addWidget(widget, self.row, self.column)
+        self.widget_base.set_tile_size(
+            self.fix_width, self.fix_height, self.column_count
+        )
 
-            self.column += 1
+    # pause the animations while the window is minimized
+    def changeEvent(self, event):
+        super().changeEvent(event)
 
-            if self.column % self.column_count == 0:
-                self.row += 1
-                self.column = 0
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            if self.isMinimized():
+                self.widget_base.clock.pause()
+            else:
+                self.widget_base.clock.resume()
 
     # minimize the window
     def on_min(self):
@@ -1029,6 +2186,8 @@ class MainWindow(QMainWindow):
                 widget.setText(MainWindow.tr(text))
 
         self.open_file_menu.setToolTip(MainWindow.tr("menu_open_file"))
+        self.open_folder_menu.setToolTip(MainWindow.tr("menu_open_folder"))
+        self.flipbook_menu.setToolTip(MainWindow.tr("menu_flipbook"))
         self.remove_file_menu.setToolTip(MainWindow.tr("menu_remove_file"))
         self.open_setting_menu.setToolTip(MainWindow.tr("menu_open_setting"))
 
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from image_helper import ImageHelper
+
+
+# probe results of the images in a folder, stored in thumbnails/index/
+# one json file per folder maps a file name to its mtime, size and probe result,
+# so the layout of a folder is known again without touching the images
+class MetadataIndex:
+    VERSION = 1
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(os.getcwd(), "thumbnails", "index")
+        self.lock = threading.Lock()
+        # folder -> {file name: [mtime_ns, size, format, width, height, frames, orientation]}
+        self.folders = {}
+        self.dirty = set()
+        self.hits = 0
+        self.misses = 0
+
+    # index shared by the GUI and the loader threads
+    @staticmethod
+    def instance():
+        with MetadataIndex._instance_lock:
+            if MetadataIndex._instance is None:
+                MetadataIndex._instance = MetadataIndex()
+            return MetadataIndex._instance
+
+    # index file of a folder
+    def index_path(self, folder):
+        key = hashlib.sha1(folder.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, key + ".json")
+
+    # entries of a folder, read from disk the first time
+    def folder_entries(self, folder):
+        entries = self.folders.get(folder)
+        if entries is not None:
+            return entries
+
+        entries = {}
+        try:
+            with open(self.index_path(folder), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MetadataIndex.VERSION and data.get("folder") == folder:
+                entries = data.get("files", {})
+        except (OSError, ValueError):
+            pass
+
+        self.folders[folder] = entries
+        return entries
+
+    # probe result of a file, see ImageHelper.probe
+    # returns (format, width, height, frame count, exif orientation)
+    def get(self, file_path):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return ("", 0, 0, 0, 1)
+
+        folder, name = os.path.split(os.path.abspath(file_path))
+
+        with self.lock:
+            entry = self.folder_entries(folder).get(name)
+            if (
+                entry is not None
+                and entry[0] == stat.st_mtime_ns
+                and entry[1] == stat.st_size
+            ):
+                self.hits += 1
+                return tuple(entry[2:])
+
+        info = ImageHelper.probe(file_path)
+
+        with self.lock:
+            self.misses += 1
+            self.folder_entries(folder)[name] = [stat.st_mtime_ns, stat.st_size] + list(
+                info
+            )
+            self.dirty.add(folder)
+
+        return info
+
+    # write the folders that changed
+    def save(self):
+        with self.lock:
+            folders = [(folder, dict(self.folders[folder])) for folder in self.dirty]
+            self.dirty = set()
+
+        for folder, entries in folders:
+            path = self.index_path(folder)
+            data = {"version": MetadataIndex.VERSION, "folder": folder, "files": entries}
+
+            try:
+                os.makedirs(self.path, exist_ok=True)
+                temp_path = "%s.%d.tmp" % (path, threading.get_ident())
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(temp_path, path)
+            except OSError as e:
+                print("MetadataIndex: write failed(%s)" % e)
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "folders": len(self.folders),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# probe the images of a folder and save its index
+# python metadata_index.py folder
+if __name__ == "__main__":
+    index = MetadataIndex.instance()
+    folder = sys.argv[1] if len(sys.argv) > 1 else os.getcwd()
+
+    for entry in os.scandir(folder):
+        if entry.is_file() and ImageHelper.is_supported(entry.name):
+            print(entry.name, index.get(entry.path))
+
+    index.save()
+    print(index.stats())
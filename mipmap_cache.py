@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from collections import OrderedDict
+
+from PySide6.QtCore import Qt
+
+from thumbnail_cache import ImageCache
+
+
+# downscaled levels of the decoded tiles, each level is half the size of the one before
+# a tile size change takes the nearest level at once while the new size is decoded,
+# levels larger than a new tile are kept, so zooming back in finds them again
+# the least recently used files are dropped once the byte budget is exceeded
+# entries are keyed by path, mtime and file size, an edited file is decoded again
+class MipmapCache:
+    MAX_SIZE = 192 * 1024 * 1024
+    # the smallest level has at least this width and height
+    MIN_SIZE = 32
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        # ImageCache.key of the file -> [QImage, ...], largest first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def instance():
+        with MipmapCache._instance_lock:
+            if MipmapCache._instance is None:
+                MipmapCache._instance = MipmapCache()
+            return MipmapCache._instance
+
+    # the image and its halves down to MIN_SIZE, called on the worker threads
+    @staticmethod
+    def levels(image):
+        levels = [image]
+        while (
+            image.width() // 2 >= MipmapCache.MIN_SIZE
+            and image.height() // 2 >= MipmapCache.MIN_SIZE
+        ):
+            image = image.scaled(
+                image.width() // 2,
+                image.height() // 2,
+                Qt.IgnoreAspectRatio,
+                Qt.SmoothTransformation,
+            )
+            levels.append(image)
+
+        return levels
+
+    # add a decoded tile of a file
+    def put(self, file_path, image):
+        if len(file_path) == 0 or image.isNull():
+            return
+
+        key = ImageCache.key(file_path)
+        if key is None:
+            return
+
+        levels = MipmapCache.levels(image)
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= MipmapCache.size_of(old)
+                levels = [level for level in old if level.width() > image.width()] + levels
+
+            self.entries[key] = levels
+            self.size += MipmapCache.size_of(levels)
+
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, entry = self.entries.popitem(last=False)
+                self.size -= MipmapCache.size_of(entry)
+
+    # the smallest level covering width x height device pixels,
+    # the largest level when none does, None when the file has no levels
+    # or was changed since they were made
+    def get(self, file_path, width, height):
+        key = ImageCache.key(file_path)
+
+        with self.lock:
+            levels = self.entries.get(key) if key is not None else None
+            if levels is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+            for level in reversed(levels):
+                if level.width() >= width and level.height() >= height:
+                    return level
+
+            return levels[0]
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.size = 0
+
+    def stats(self):
+        return {
+            "files": len(self.entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def size_of(levels):
+        return sum(level.sizeInBytes() for level in levels)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+
+import multiprocessing
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+from PySide6 import QtGui
+from PySide6.QtCore import QRunnable
+
+from image_helper import ImageHelper
+from mipmap_cache import MipmapCache
+
+
+# entry of a decoder process
+# decodes tiles and writes the pixels into the shared memory block of the job,
+# results are (job id, (width, height, bytes per line, alpha, ratio, original width,
+# original height)) or (job id, None) when the file could not be decoded
+def decode_worker(jobs, results):
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+
+        job_id, name, size, file_path, fix_width, fix_height, ratio = job
+        try:
+            image, orig_width, orig_height = ImageHelper.image_scaled(
+                file_path, fix_width, fix_height, ratio
+            )
+            if image.isNull():
+                results.put((job_id, None))
+                continue
+
+            alpha = image.hasAlphaChannel()
+            image = image.convertToFormat(
+                QtGui.QImage.Format_ARGB32_Premultiplied
+                if alpha
+                else QtGui.QImage.Format_RGB32
+            )
+            length = image.sizeInBytes()
+            if length > size:
+                results.put((job_id, None))
+                continue
+
+            block = shared_memory.SharedMemory(name=name)
+            block.buf[:length] = image.constBits()[:length]
+            block.close()
+
+            results.put(
+                (
+                    job_id,
+                    (
+                        image.width(),
+                        image.height(),
+                        image.bytesPerLine(),
+                        alpha,
+                        image.devicePixelRatio(),
+                        orig_width,
+                        orig_height,
+                    ),
+                )
+            )
+        except Exception as e:
+            print("decode_worker: %s(%s)" % (file_path, e))
+            results.put((job_id, None))
+
+
+# build the mipmap levels of a decoded tile on a pool thread
+class MipmapTask(QRunnable):
+    def __init__(self, file_path, image):
+        super().__init__()
+        self.file_path = file_path
+        self.image = image
+
+    def run(self):
+        MipmapCache.instance().put(self.file_path, self.image)
+
+
+# one decoder process and the job it is working on
+class DecodeProcess:
+    def __init__(self, context, results):
+        self.jobs = context.Queue()
+        self.process = context.Process(
+            target=decode_worker, args=(self.jobs, results), daemon=True
+        )
+        self.process.start()
+
+        self.job_id = None
+        self.started = 0.0
+
+
+# decode still images in worker processes instead of threads
+# a process gets one job at a time, the pixels come back in a shared memory block
+# that is copied once into the QImage of the result and freed at once,
+# the loaded signal and the mipmap levels share that image
+# a job running longer than TIMEOUT kills its process, the tile fails and a new
+# process takes the place of the stuck one
+class ProcessDecoder:
+    TIMEOUT = 10.0
+
+    def __init__(self, loader, count):
+        self.loader = loader
+        self.count = max(1, count)
+        self.lock = threading.Lock()
+
+        # processes are spawned, forking a process with Qt threads is not safe
+        self.context = multiprocessing.get_context("spawn")
+        self.results = self.context.Queue()
+        self.processes = [
+            DecodeProcess(self.context, self.results) for _ in range(self.count)
+        ]
+
+        # job id -> (task, shared memory block)
+        self.jobs = {}
+        # blocks still referenced when they were freed, closed again by check
+        self.stale = []
+
+        self.stopped = False
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    # start a task on an idle process, returns False when all processes are busy
+    def submit(self, task):
+        with self.lock:
+            idle = [process for process in self.processes if process.job_id is None]
+            if len(idle) == 0:
+                return False
+
+            # the tile is at most fix_width x fix_height device pixels, 4 bytes each
+            size = (
+                max(1, int(task.fix_width * task.ratio))
+                * max(1, int(task.fix_height * task.ratio))
+                * 4
+            )
+            block = shared_memory.SharedMemory(create=True, size=size)
+
+            process = idle[0]
+            process.job_id = task.task_id
+            process.started = time.monotonic()
+            self.jobs[task.task_id] = (task, block)
+
+        process.jobs.put(
+            (
+                task.task_id,
+                block.name,
+                size,
+                task.file_path,
+                task.fix_width,
+                task.fix_height,
+                task.ratio,
+            )
+        )
+        return True
+
+    # collect the results and watch the running jobs
+    def listen(self):
+        while not self.stopped:
+            try:
+                job_id, result = self.results.get(timeout=0.1)
+            except queue.Empty:
+                pass
+            except (EOFError, OSError):
+                return
+            else:
+                self.complete(job_id, result)
+
+            self.check()
+
+    # hand the result of a job to the loader
+    def complete(self, job_id, result):
+        with self.lock:
+            job = self.jobs.pop(job_id, None)
+            for process in self.processes:
+                if process.job_id == job_id:
+                    process.job_id = None
+        if job is None:
+            return
+
+        task, block = job
+        if result is None:
+            ProcessDecoder.free(block)
+            self.loader.finish(task, 0, QtGui.QImage(), 0, 0)
+            return
+
+        width, height, bytes_per_line, alpha, ratio, orig_width, orig_height = result
+        image = QtGui.QImage(
+            block.buf,
+            width,
+            height,
+            bytes_per_line,
+            QtGui.QImage.Format_ARGB32_Premultiplied
+            if alpha
+            else QtGui.QImage.Format_RGB32,
+        ).copy()
+        image.setDevicePixelRatio(ratio)
+        self.free_later(block)
+
+        # smaller levels for tile size changes, built on a pool thread
+        self.loader.pool.start(MipmapTask(task.file_path, image))
+
+        self.loader.finish(task, 0, image, orig_width, orig_height)
+
+    # replace the processes that are stuck or died
+    # the processes are spawned outside the lock, submit keeps using the others
+    def check(self):
+        if self.stopped:
+            return
+
+        now = time.monotonic()
+        dead = []
+
+        with self.lock:
+            for process in self.processes:
+                if process.job_id is None and process.process.is_alive():
+                    continue
+                if (
+                    process.job_id is not None
+                    and process.process.is_alive()
+                    and now - process.started < ProcessDecoder.TIMEOUT
+                ):
+                    continue
+                dead.append(process)
+
+            self.processes = [
+                process for process in self.processes if process not in dead
+            ]
+            stale = self.stale
+            self.stale = []
+
+        for block in stale:
+            self.free_later(block)
+
+        if len(dead) == 0:
+            return
+
+        failed = []
+        spawned = []
+        for process in dead:
+            print(
+                "ProcessDecoder: restart process %d(job %s)"
+                % (process.process.pid, process.job_id)
+            )
+            process.process.kill()
+            process.process.join(1)
+
+            if process.job_id is not None:
+                failed.append(process.job_id)
+            spawned.append(DecodeProcess(self.context, self.results))
+
+        with self.lock:
+            self.processes += spawned
+
+        # stopped while spawning
+        if self.stopped:
+            for process in spawned:
+                process.process.kill()
+            return
+
+        for job_id in failed:
+            self.complete(job_id, None)
+
+        self.loader.dispatch()
+
+    # free a block, kept for the next check while it is still referenced
+    def free_later(self, block):
+        if not ProcessDecoder.free(block):
+            with self.lock:
+                self.stale.append(block)
+
+    # unlink a block and unmap it, returns False while an image still uses it
+    @staticmethod
+    def free(block):
+        try:
+            block.unlink()
+        except FileNotFoundError:
+            pass
+
+        try:
+            block.close()
+        except BufferError:
+            return False
+
+        return True
+
+    # stop the processes, running jobs are dropped
+    def stop(self):
+        self.stopped = True
+
+        for process in self.processes:
+            process.jobs.put(None)
+        for process in self.processes:
+            process.process.join(1)
+            if process.process.is_alive():
+                process.process.kill()
+
+        with self.lock:
+            blocks = [block for task, block in self.jobs.values()]
+            blocks += self.stale
+            self.jobs = {}
+            self.stale = []
+
+        for block in blocks:
+            ProcessDecoder.free(block)
@@ -13,6 +13,8 @@ class Setting:
     def __init__(self):
         self.language = Language.Chinese.value
         self.theme = Theme.COMMON_DEFAULT
+        # processes decoding the tiles, 0 decodes them on threads
+        self.decode_processes = 0
 
     def get_locale(self):
         if self.language == Language.English.value:
@@ -26,6 +28,9 @@ class Setting:
     def get_theme(self):
         return FileUtils.get_fullname(self.theme)
 
+    def get_decode_processes(self):
+        return self.decode_processes
+
     def load(self):
         path = os.path.join(os.getcwd(), "setting.json")
         if not os.path.exists(path):
@@ -55,12 +60,28 @@ class Setting:
                 if ThemeUtils.validate(theme):
                     self.theme = theme
 
+                decode_processes = setting.get("decode_processes")
+                if isinstance(decode_processes, int) and decode_processes >= 0:
+                    self.decode_processes = decode_processes
+
     @staticmethod
     def save(language, theme):
         if not language or not theme:
             return
 
         path = os.path.join(os.getcwd(), "setting.json")
+
+        # keep the other settings
+        setting = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                setting = json.loads(f.read())
+        except (OSError, ValueError):
+            pass
+        if not isinstance(setting, dict):
+            setting = {}
+
         with open(path, "w", encoding="utf-8") as f:
-            setting = {"language": language, "theme": theme}
+            setting["language"] = language
+            setting["theme"] = theme
             f.write(json.dumps(setting))
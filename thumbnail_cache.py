@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import struct
+import sys
+import threading
+from collections import OrderedDict
+
+from PySide6 import QtCore, QtGui
+
+
+# decoded tiles stored on disk(thumbnails/)
+# an entry is keyed by path, mtime, file size and tile size,
+# the mtime of the entry file is its last use and drives the LRU pruning
+class ThumbnailCache:
+    MAX_SIZE = 512 * 1024 * 1024
+    EXT = ".thumb"
+    # original width and height in front of the encoded image
+    HEADER = struct.Struct("<II")
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=None, max_size=MAX_SIZE):
+        self.path = path or os.path.join(os.getcwd(), "thumbnails")
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.total_size = None
+        # the first put scans the folder outside the lock,
+        # the entries written meanwhile are added once it is done
+        self.scanning = False
+        self.pending_size = 0
+        # one thread prunes at a time, the others keep writing
+        self.pruning = False
+        self.hits = 0
+        self.misses = 0
+
+    # cache shared by all loader threads
+    @staticmethod
+    def instance():
+        with ThumbnailCache._instance_lock:
+            if ThumbnailCache._instance is None:
+                ThumbnailCache._instance = ThumbnailCache()
+            return ThumbnailCache._instance
+
+    # entry file of an image at a tile size, None if the image is unreadable
+    def entry_path(self, file_path, width, height):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        text = "%s|%d|%d|%dx%d" % (
+            os.path.abspath(file_path),
+            stat.st_mtime_ns,
+            stat.st_size,
+            width,
+            height,
+        )
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+        return os.path.join(self.path, key[:2], key + ThumbnailCache.EXT)
+
+    # returns (image, original width, original height) or None
+    def get(self, file_path, width, height):
+        path = self.entry_path(file_path, width, height)
+        if path is None:
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            # mark as recently used
+            os.utime(path, None)
+        except OSError:
+            self.count(False)
+            return None
+
+        if len(data) <= ThumbnailCache.HEADER.size:
+            self.count(False)
+            return None
+
+        orig_width, orig_height = ThumbnailCache.HEADER.unpack_from(data)
+        image = QtGui.QImage.fromData(data[ThumbnailCache.HEADER.size :])
+        if image.isNull():
+            self.count(False)
+            return None
+
+        self.count(True)
+        return (image, orig_width, orig_height)
+
+    def count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    # store a decoded tile
+    def put(self, file_path, width, height, image, orig_width, orig_height):
+        path = self.entry_path(file_path, width, height)
+        if path is None or image.isNull():
+            return
+
+        data = QtCore.QByteArray()
+        buffer = QtCore.QBuffer(data)
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        if image.hasAlphaChannel():
+            image.save(buffer, "PNG")
+        else:
+            image.save(buffer, "JPG", 90)
+        buffer.close()
+
+        content = ThumbnailCache.HEADER.pack(orig_width, orig_height) + data.data()
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename, readers never see half written entries
+            temp_path = "%s.%d.tmp" % (path, threading.get_ident())
+            with open(temp_path, "wb") as f:
+                f.write(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print("ThumbnailCache: write failed(%s)" % e)
+            return
+
+        with self.lock:
+            if self.total_size is not None:
+                self.total_size += len(content)
+                over = self.total_size > self.max_size
+                scan = False
+            else:
+                self.pending_size += len(content)
+                scan = not self.scanning
+                self.scanning = True
+                over = False
+
+        if scan:
+            scanned = self.scan()[1]
+            with self.lock:
+                # an entry the scan saw may be counted twice, prune recounts exactly
+                self.total_size = scanned + self.pending_size
+                self.pending_size = 0
+                self.scanning = False
+                over = self.total_size > self.max_size
+
+        if over:
+            self.prune()
+
+    # all entries as (last use, size, path)
+    def entries(self):
+        entries = []
+        if not os.path.isdir(self.path):
+            return entries
+
+        for bucket in os.scandir(self.path):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if not entry.name.endswith(ThumbnailCache.EXT):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        return entries
+
+    # (count, total size)
+    def scan(self):
+        entries = self.entries()
+        return (len(entries), sum(entry[1] for entry in entries))
+
+    # delete the least recently used entries until the cache is below 90% of the cap
+    # the folder is scanned and the files deleted outside the lock,
+    # the size written meanwhile is kept, returns the number of deleted entries
+    def prune(self):
+        with self.lock:
+            if self.pruning:
+                return 0
+            self.pruning = True
+            start_size = self.total_size
+
+        removed = 0
+        total_size = None
+        try:
+            entries = self.entries()
+            entries.sort()
+
+            total_size = sum(entry[1] for entry in entries)
+            limit = int(self.max_size * 0.9)
+
+            for _, size, path in entries:
+                if total_size <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total_size -= size
+                removed += 1
+        finally:
+            with self.lock:
+                if total_size is not None:
+                    if start_size is not None and self.total_size is not None:
+                        total_size += self.total_size - start_size
+                    self.total_size = total_size
+                self.pruning = False
+
+        return removed
+
+    def stats(self):
+        count, total_size = self.scan()
+        return {
+            "path": self.path,
+            "count": count,
+            "size": total_size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# decoded images kept in memory, keyed by path, mtime, file size and image size
+# the least recently used images are dropped once the byte budget is exceeded
+class ImageCache:
+    MAX_SIZE = 128 * 1024 * 1024
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def instance():
+        with ImageCache._instance_lock:
+            if ImageCache._instance is None:
+                ImageCache._instance = ImageCache()
+            return ImageCache._instance
+
+    # key of a file at an image size, None if the file is unreadable
+    @staticmethod
+    def key(file_path, *size):
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+
+        return (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size) + size
+
+    # returns (image, original width, original height) or None
+    def get(self, key):
+        if key is None:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+
+            self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, image, orig_width, orig_height):
+        if key is None or image.isNull():
+            return
+
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= old[0].sizeInBytes()
+
+            self.entries[key] = (image, orig_width, orig_height)
+            self.size += image.sizeInBytes()
+
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, entry = self.entries.popitem(last=False)
+                self.size -= entry[0].sizeInBytes()
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.size = 0
+
+
+# maintenance: python thumbnail_cache.py [max size in MB]
+# prints the statistics and prunes the cache
+if __name__ == "__main__":
+    cache = ThumbnailCache()
+    if len(sys.argv) > 1:
+        cache.max_size = int(sys.argv[1]) * 1024 * 1024
+
+    print("ThumbnailCache:", cache.stats())
+    print("ThumbnailCache: removed %d entries" % cache.prune())
+    print("ThumbnailCache:", cache.stats())
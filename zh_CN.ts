@@ -45,6 +45,14 @@
         <source>menu_open_file</source>
         <translation>打开文件</translation>
     </message>
+    <message>
+        <source>menu_open_folder</source>
+        <translation>打开文件夹</translation>
+    </message>
+    <message>
+        <source>menu_flipbook</source>
+        <translation>序列播放</translation>
+    </message>
     <message>
         <source>menu_remove_file</source>
         <translation>清空所有</translation>
@@ -92,11 +100,27 @@
 	<message>
         <source>title_remove_image</source>
         <translation>移除图片</translation>
+    </message>
+    <message>
+        <source>title_select_all</source>
+        <translation>全选</translation>
+    </message>
+    <message>
+        <source>title_remove_selected</source>
+        <translation>移除所选</translation>
+    </message>
+    <message>
+        <source>title_export</source>
+        <translation>导出到...</translation>
     </message>
 	<message>
         <source>title_choose_image</source>
         <translation>选择图片</translation>
     </message>
+    <message>
+        <source>title_choose_folder</source>
+        <translation>选择文件夹</translation>
+    </message>
 	
 </context>
 <context>
@@ -160,6 +184,29 @@
         <translation>像素</translation>
     </message>
 </context>
+<context>
+    <name>FlipbookWindow</name>
+    <message>
+        <source>title_flipbook</source>
+        <translation>序列播放</translation>
+    </message>
+    <message>
+        <source>title_play</source>
+        <translation>播放</translation>
+    </message>
+    <message>
+        <source>title_pause</source>
+        <translation>暂停</translation>
+    </message>
+    <message>
+        <source>title_dropped</source>
+        <translation>丢帧</translation>
+    </message>
+    <message>
+        <source>title_buffered</source>
+        <translation>缓冲</translation>
+    </message>
+</context>
 <context>
     <name>SettingWindow</name>
 	<message>
@@ -0,0 +1,637 @@
+# -*- coding: utf-8 -*-
+
+import math
+import threading
+from collections import OrderedDict
+
+from PySide6 import QtCore, QtGui, QtWidgets
+from PySide6.QtCore import (
+    Qt,
+    QObject,
+    QPointF,
+    QRect,
+    QRectF,
+    QRunnable,
+    QSize,
+    QThreadPool,
+    Signal,
+)
+
+from image_helper import ImageHelper
+from thumbnail_cache import ImageCache
+
+
+# decode one tile of the pyramid
+# with a clip rect only the region is decoded, scaled while decoding(JPEG DCT),
+# without one the tile is cut from the base image
+class TileTask(QRunnable):
+    # base: base image and its scale to the full size, None decodes the region
+    def __init__(self, signals, generation, key, file_path, source, size, base=None):
+        super().__init__()
+
+        self.signals = signals
+        self.generation = generation
+        self.key = key
+        self.file_path = file_path
+        self.source = source
+        self.size = size
+        self.base = base
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+
+        if self.base is None:
+            reader = QtGui.QImageReader(self.file_path)
+            reader.setAutoTransform(False)
+            reader.setClipRect(self.source)
+            reader.setScaledSize(self.size)
+            image = reader.read()
+        else:
+            base, ratio = self.base
+            source = QRectF(self.source)
+            region = base.copy(
+                QRect(
+                    int(source.x() * ratio),
+                    int(source.y() * ratio),
+                    max(1, math.ceil(source.width() * ratio)),
+                    max(1, math.ceil(source.height() * ratio)),
+                )
+            )
+            image = region.scaled(
+                self.size, aspectMode=Qt.IgnoreAspectRatio, mode=Qt.SmoothTransformation
+            )
+
+        self.signals.tile_loaded.emit(self.generation, self.key, image)
+
+
+# decode the whole image once, for formats without region decoding
+# overview: longest side of the small image shown while the tiles load
+# key: viewer cache key of the file
+# only JPEG is scaled while decoding, the other handlers(TIFF, PNG, ...) decode
+# the whole image before scaling it, files above MAX_DECODE_PIXELS are not read
+class BaseTask(QRunnable):
+    MAX_DECODE_PIXELS = 128 * 1000 * 1000
+    SCALED_FORMATS = ("jpeg", "jpg")
+
+    def __init__(self, signals, key, file_path, max_pixels, overview):
+        super().__init__()
+
+        self.signals = signals
+        self.key = key
+        self.file_path = file_path
+        self.max_pixels = max_pixels
+        self.overview = overview
+        self.cancelled = False
+
+    def run(self):
+        if self.cancelled:
+            return
+
+        reader, device, orientation = ImageHelper.image_reader(self.file_path)
+        if device is None:
+            transformation = reader.transformation()
+            rotated = bool(transformation & QtGui.QImageIOHandler.TransformationRotate90)
+            tiled = (
+                reader.supportsOption(QtGui.QImageIOHandler.ClipRect)
+                and transformation == QtGui.QImageIOHandler.TransformationNone
+            )
+        else:
+            rotated = orientation >= 5
+            tiled = False
+
+        # size with the orientation applied
+        size = reader.size()
+        if size.isValid() and rotated:
+            size.transpose()
+
+        if tiled:
+            # only a small overview, the tiles are decoded by region
+            reader.setScaledSize(BaseTask.fit(size, self.overview))
+            overview = reader.read()
+            self.signals.base_loaded.emit(self.key, size, None, overview)
+            return
+
+        # the base is limited to max_pixels, deeper zoom levels are upscaled from it
+        # handlers without ScaledSize are scaled by Qt after the read
+        if size.isValid():
+            pixels = size.width() * size.height()
+            image_format = bytes(reader.format()).decode("ascii", "ignore").lower()
+            if (
+                pixels > BaseTask.MAX_DECODE_PIXELS
+                and image_format not in BaseTask.SCALED_FORMATS
+            ):
+                print(
+                    "BaseTask: %s too large to decode(%dx%d %s)"
+                    % (self.file_path, size.width(), size.height(), image_format)
+                )
+                self.signals.base_loaded.emit(self.key, size, QtGui.QImage(), QtGui.QImage())
+                return
+
+            if pixels > self.max_pixels:
+                scale = math.sqrt(self.max_pixels / pixels)
+                scaled = QSize(
+                    max(1, int(size.width() * scale)), max(1, int(size.height() * scale))
+                )
+                # the reader scales before the orientation is applied
+                if rotated:
+                    scaled.transpose()
+                reader.setScaledSize(scaled)
+
+        base = ImageHelper.oriented(reader.read(), orientation)
+        if not size.isValid():
+            size = base.size()
+
+        overview = base.scaled(
+            BaseTask.fit(base.size(), self.overview),
+            aspectMode=Qt.IgnoreAspectRatio,
+            mode=Qt.SmoothTransformation,
+        )
+        self.signals.base_loaded.emit(self.key, size, base, overview)
+
+    # size scaled down to fit a square
+    @staticmethod
+    def fit(size, side):
+        if not size.isValid() or (size.width() <= side and size.height() <= side):
+            return size
+
+        return size.scaled(side, side, Qt.KeepAspectRatio)
+
+
+class ZoomSignals(QObject):
+    # cache key, image size, base QImage or None when tiles are decoded by region,
+    # overview QImage
+    base_loaded = Signal(object, object, object, object)
+    # generation, (level, column, row), QImage
+    tile_loaded = Signal(int, object, object)
+
+
+# decoded viewer state of the last files, reopening one of them shows it at once
+# an entry is [image size, base QImage or None, overview QPixmap, tiles, tiles size]
+class ViewerCache:
+    MAX_SIZE = 256 * 1024 * 1024
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_size=MAX_SIZE):
+        self.max_size = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    @staticmethod
+    def instance():
+        with ViewerCache._instance_lock:
+            if ViewerCache._instance is None:
+                ViewerCache._instance = ViewerCache()
+            return ViewerCache._instance
+
+    @staticmethod
+    def size_of(entry):
+        image_size, base, overview, tiles, tiles_size = entry
+        size = tiles_size
+        if base is not None:
+            size += base.sizeInBytes()
+        if overview is not None:
+            size += overview.width() * overview.height() * 4
+        return size
+
+    def contains(self, key):
+        return key in self.entries
+
+    # the entry is taken out, the view owns it until it is put back
+    def take(self, key):
+        if key is None:
+            return None
+
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= ViewerCache.size_of(entry)
+        return entry
+
+    def put(self, key, entry):
+        if key is None:
+            return
+
+        self.take(key)
+        self.entries[key] = entry
+        self.size += ViewerCache.size_of(entry)
+
+        while self.size > self.max_size and len(self.entries) > 1:
+            _, old = self.entries.popitem(last=False)
+            self.size -= ViewerCache.size_of(old)
+
+
+# tiled multi-resolution image view
+# the image is cut into TILE_SIZE tiles at power of two levels, only the tiles
+# of the visible region at the level of the current zoom are decoded and kept in
+# a byte budgeted LRU, the overview is drawn where tiles are still missing
+# ctrl+wheel zooms around the cursor, dragging pans, double click toggles fit and 100%
+class ZoomView(QtWidgets.QWidget):
+    TILE_SIZE = 512
+    CACHE_BUDGET = 192 * 1024 * 1024
+    # base image of formats without region decoding
+    MAX_BASE_PIXELS = 48 * 1000 * 1000
+    OVERVIEW_SIZE = 2048
+    MAX_ZOOM = 8.0
+
+    # zoom factor changed
+    zoom_changed = Signal(float)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.file_path = ""
+        self.cache_key = None
+        self.generation = 0
+        self.image_size = QSize()
+        # the tiles are decoded once the base task tells how
+        self.ready = False
+        self.base = None
+        self.overview = None
+
+        # (level, column, row) -> QPixmap
+        self.tiles = OrderedDict()
+        self.cache_size = 0
+        # (level, column, row) -> TileTask
+        self.pending = {}
+        # cache key -> BaseTask of the current file and the prefetched files
+        self.base_tasks = {}
+
+        # screen pixels per image pixel, image point at the top left corner
+        self.scale = 1.0
+        self.offset = QPointF(0, 0)
+        self.fitted = True
+        self.drag_pos = None
+
+        # the pool is deleted first and waits for its running tasks,
+        # their signals are still there
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(
+            max(2, QThreadPool.globalInstance().maxThreadCount() // 2)
+        )
+
+        self.signals = ZoomSignals(self)
+        self.signals.base_loaded.connect(self.on_base_loaded)
+        self.signals.tile_loaded.connect(self.on_tile_loaded)
+
+        self.setMouseTracking(True)
+        self.setFocusPolicy(Qt.StrongFocus)
+
+    # show a file, placeholder: pixmap shown until the overview is decoded
+    # a file shown before is restored from the viewer cache with its tiles
+    def set_file(self, file_path, placeholder=None):
+        self.store()
+
+        self.generation += 1
+        self.cancel_pending()
+
+        self.file_path = file_path
+        self.cache_key = ImageCache.key(file_path, "viewer")
+        self.fitted = True
+
+        entry = ViewerCache.instance().take(self.cache_key)
+        if entry is not None:
+            self.image_size, self.base, self.overview, self.tiles, self.cache_size = entry
+            self.ready = True
+            self.fit()
+            return
+
+        self.tiles = OrderedDict()
+        self.cache_size = 0
+        self.ready = False
+        self.base = None
+        self.overview = placeholder
+
+        width, height = ImageHelper.image_size(file_path)
+        self.image_size = QSize(width, height)
+        if self.image_size.isEmpty() and placeholder is not None:
+            self.image_size = placeholder.size() / placeholder.devicePixelRatio()
+        self.fit()
+
+        # a prefetch of the file may be running already
+        if self.cache_key not in self.base_tasks:
+            self.start_base(self.cache_key, file_path)
+
+    def start_base(self, key, file_path):
+        task = BaseTask(
+            self.signals,
+            key,
+            file_path,
+            ZoomView.MAX_BASE_PIXELS,
+            ZoomView.OVERVIEW_SIZE,
+        )
+        self.base_tasks[key] = task
+        self.pool.start(task)
+
+    # decode the overview and base of files into the viewer cache,
+    # prefetches of files that are not in the list anymore are dropped
+    def prefetch(self, file_paths):
+        keys = {}
+        for file_path in file_paths:
+            key = ImageCache.key(file_path, "viewer")
+            if key is not None:
+                keys[key] = file_path
+
+        for key, task in list(self.base_tasks.items()):
+            if key != self.cache_key and key not in keys:
+                task.cancelled = True
+                del self.base_tasks[key]
+
+        for key, file_path in keys.items():
+            if (
+                key == self.cache_key
+                or key in self.base_tasks
+                or ViewerCache.instance().contains(key)
+            ):
+                continue
+            self.start_base(key, file_path)
+
+    # keep the decoded state of the current file in the viewer cache
+    def store(self):
+        if not self.ready or self.cache_key is None:
+            return
+
+        ViewerCache.instance().put(
+            self.cache_key,
+            [self.image_size, self.base, self.overview, self.tiles, self.cache_size],
+        )
+        # the cache owns the images now, they are dropped with its entry
+        self.cache_key = None
+        self.ready = False
+        self.base = None
+        self.overview = None
+        self.tiles = OrderedDict()
+        self.cache_size = 0
+
+    def hideEvent(self, event):
+        self.store()
+        # the cached tiles are not touched by late results
+        self.generation += 1
+        self.cancel_pending()
+
+    # shown again after a hide stored the file, take it back from the cache
+    def showEvent(self, event):
+        if self.cache_key is None and len(self.file_path) > 0:
+            self.set_file(self.file_path)
+
+    # drop the queued decodes before the view is deleted
+    def stop(self):
+        for task in self.base_tasks.values():
+            task.cancelled = True
+        self.base_tasks = {}
+        self.cancel_pending()
+        self.pool.clear()
+
+    def on_base_loaded(self, key, size, base, overview):
+        if self.base_tasks.pop(key, None) is None:
+            return
+
+        # tiled files have no base, the overview tells if the file could be read
+        failed = overview.isNull() if base is None else base.isNull()
+
+        # a prefetched file, failed ones are tried again when they are shown
+        if key != self.cache_key or self.ready:
+            if not failed:
+                ViewerCache.instance().put(
+                    key, [size, base, QtGui.QPixmap.fromImage(overview), OrderedDict(), 0]
+                )
+            return
+
+        # the placeholder stays, no tiles are decoded
+        if failed:
+            print("ZoomView: failed to load %s" % self.file_path)
+            return
+
+        if size.isValid() and size != self.image_size:
+            self.image_size = QSize(size)
+            self.fit()
+
+        self.ready = True
+        self.base = base
+        if not overview.isNull():
+            self.overview = QtGui.QPixmap.fromImage(overview)
+        self.update()
+
+    def on_tile_loaded(self, generation, key, image):
+        self.pending.pop(key, None)
+        if generation != self.generation or image.isNull():
+            return
+
+        pixmap = QtGui.QPixmap.fromImage(image)
+        self.tiles[key] = pixmap
+        self.cache_size += pixmap.width() * pixmap.height() * 4
+
+        # drop the least recently drawn tiles
+        while self.cache_size > ZoomView.CACHE_BUDGET and len(self.tiles) > 1:
+            _, old = self.tiles.popitem(last=False)
+            self.cache_size -= old.width() * old.height() * 4
+
+        self.update()
+
+    # tiles queued for a view that is gone are skipped
+    def cancel_pending(self):
+        for task in self.pending.values():
+            task.cancelled = True
+        self.pending = {}
+
+    def fit_scale(self):
+        if self.image_size.isEmpty():
+            return 1.0
+
+        return min(
+            self.width() / self.image_size.width(),
+            self.height() / self.image_size.height(),
+            1.0,
+        )
+
+    # whole image in the view, centered
+    def fit(self):
+        self.fitted = True
+        self.scale = self.fit_scale()
+        self.center()
+        self.zoom_changed.emit(self.scale)
+        self.update()
+
+    # keep the image centered on the axes where it is smaller than the view
+    def center(self):
+        width = self.width() / self.scale
+        height = self.height() / self.scale
+
+        x = self.offset.x()
+        y = self.offset.y()
+        if width >= self.image_size.width():
+            x = (self.image_size.width() - width) / 2
+        else:
+            x = min(max(0, x), self.image_size.width() - width)
+        if height >= self.image_size.height():
+            y = (self.image_size.height() - height) / 2
+        else:
+            y = min(max(0, y), self.image_size.height() - height)
+
+        self.offset = QPointF(x, y)
+
+    # zoom by factor keeping the image point under pos in place
+    def zoom(self, factor, pos=None):
+        if self.image_size.isEmpty():
+            return
+
+        if pos is None:
+            pos = QPointF(self.width() / 2, self.height() / 2)
+
+        scale = min(max(self.scale * factor, self.fit_scale() / 4), ZoomView.MAX_ZOOM)
+        point = self.offset + pos / self.scale
+        level = self.level()
+
+        self.scale = scale
+        self.offset = point - pos / scale
+        self.fitted = False
+        self.center()
+        # the tiles of the old level are not needed anymore
+        if self.level() != level:
+            self.cancel_pending()
+        self.zoom_changed.emit(self.scale)
+        self.update()
+
+    # pyramid level of the current zoom, level n is 1 / 2^n of the full size
+    def level(self):
+        ratio = self.scale * self.devicePixelRatioF()
+        if ratio >= 1:
+            return 0
+
+        level = int(math.floor(math.log2(1 / ratio)))
+        # the coarsest level still has one tile
+        longest = max(self.image_size.width(), self.image_size.height())
+        max_level = max(0, math.ceil(math.log2(max(1, longest / ZoomView.TILE_SIZE))))
+        return min(level, max_level)
+
+    # tiles of a level in the visible region, ((level, column, row), source rect)
+    def visible_tiles(self, level):
+        span = ZoomView.TILE_SIZE << level
+        image_width = self.image_size.width()
+        image_height = self.image_size.height()
+
+        left = max(0, self.offset.x())
+        top = max(0, self.offset.y())
+        right = min(image_width, self.offset.x() + self.width() / self.scale)
+        bottom = min(image_height, self.offset.y() + self.height() / self.scale)
+
+        tiles = []
+        for row in range(int(top // span), int(math.ceil(bottom / span))):
+            for column in range(int(left // span), int(math.ceil(right / span))):
+                x = column * span
+                y = row * span
+                source = QRect(
+                    x, y, min(span, image_width - x), min(span, image_height - y)
+                )
+                tiles.append(((level, column, row), source))
+
+        return tiles
+
+    # widget rectangle of an image region
+    def target_rect(self, source):
+        return QRectF(
+            (source.x() - self.offset.x()) * self.scale,
+            (source.y() - self.offset.y()) * self.scale,
+            source.width() * self.scale,
+            source.height() * self.scale,
+        )
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.SmoothPixmapTransform)
+
+        if self.image_size.isEmpty():
+            return
+
+        image_rect = self.target_rect(QRect(QtCore.QPoint(0, 0), self.image_size))
+        if self.overview is not None:
+            painter.drawPixmap(image_rect, self.overview, QRectF(self.overview.rect()))
+
+        if not self.ready or self.overview_sharp():
+            return
+
+        level = self.level()
+        for key, source in self.visible_tiles(level):
+            pixmap = self.tiles.get(key)
+            if pixmap is not None:
+                self.tiles.move_to_end(key)
+                painter.drawPixmap(
+                    self.target_rect(source), pixmap, QRectF(pixmap.rect())
+                )
+            elif key not in self.pending:
+                self.request(key, source)
+
+    # tiles are not needed while the overview has at least the screen resolution
+    def overview_sharp(self):
+        if self.overview is None:
+            return False
+
+        ratio = self.overview.width() / max(1, self.image_size.width())
+        return ratio >= self.scale * self.devicePixelRatioF()
+
+    # decode a tile in the background
+    def request(self, key, source):
+        level = key[0]
+        size = QSize(
+            max(1, math.ceil(source.width() / (1 << level))),
+            max(1, math.ceil(source.height() / (1 << level))),
+        )
+
+        # formats with region decoding have no base image
+        base = None
+        if self.base is not None:
+            base = (self.base, self.base.width() / self.image_size.width())
+
+        task = TileTask(
+            self.signals, self.generation, key, self.file_path, source, size, base
+        )
+        self.pending[key] = task
+        self.pool.start(task)
+
+    def resizeEvent(self, event):
+        if self.fitted:
+            self.fit()
+        else:
+            self.center()
+
+    # ctrl+wheel zooms, the plain wheel is left to the window
+    def wheelEvent(self, event):
+        if not event.modifiers() & Qt.ControlModifier:
+            event.ignore()
+            return
+
+        steps = event.angleDelta().y() / 120
+        if steps == 0:
+            return
+
+        self.zoom(1.25**steps, event.position())
+        event.accept()
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self.drag_pos = event.position()
+            self.setCursor(Qt.ClosedHandCursor)
+
+    def mouseMoveEvent(self, event):
+        if self.drag_pos is None:
+            return
+
+        delta = event.position() - self.drag_pos
+        self.drag_pos = event.position()
+
+        self.offset -= delta / self.scale
+        self.fitted = False
+        self.center()
+        self.update()
+
+    def mouseReleaseEvent(self, event):
+        self.drag_pos = None
+        self.unsetCursor()
+
+    def mouseDoubleClickEvent(self, event):
+        if self.fitted:
+            self.zoom(1.0 / self.scale, event.position())
+        else:
+            self.fit()